@@ -1,9 +1,34 @@
-import streamlit as st
-import ollama
-from typing import List
+import os
 import time
-import requests
-import streamlit.components.v1 as components
+from contextlib import ExitStack
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from compare import MAX_COMPARE_MODELS, comparison_budget, plan_batches
+from config import (EMBED_MODEL, HISTORY_LOAD_LIMIT, HISTORY_RENDER_WINDOW, IDLE_UNLOAD_TIMEOUT,
+                    RESPONSE_CACHE, STATUS_REFRESH_INTERVAL)
+from conversations import ConversationStore
+from core import NeuralNexus
+from documents import DocumentIndex, documents_message
+from history import fit_history, model_history, set_message_tokens
+from jobs import LOAD, UNLOAD
+from lifecycle import changed_load_options
+from metrics import metrics_caption
+from model_status import LOADED, UNLOADED
+from prewarm import Prewarmer, UsageHistory
+from profiling import PhaseTimer
+from response_cache import ResponseCache, cache_key
+from scheduler import QueueFull
+from streaming import StreamRenderer
+
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+
+@st.cache_resource(show_spinner=False)
+def load_stylesheet():
+    """The app's CSS wrapped in a <style> tag"""
+    with open(STYLESHEET, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
 
 # Set page config for standalone window
 st.set_page_config(
@@ -18,209 +43,10 @@ st.set_page_config(
     }
 )
 
-# Add custom CSS for a more compact interface
-st.markdown("""
-    <style>
-    /* Main app with circuit pattern background */
-    .stApp {
-        background-color: #0a0a12;
-        background-image: 
-            linear-gradient(45deg, #0a0a12 0%, #1a1a2f 100%),
-            linear-gradient(90deg, rgba(0, 255, 157, 0.05) 1px, transparent 1px),
-            linear-gradient(0deg, rgba(0, 255, 157, 0.05) 1px, transparent 1px);
-        background-size: 100% 100%, 20px 20px, 20px 20px;
-        background-position: 0 0, 0 0, 0 0;
-    }
-    
-    /* Custom header with enhanced glow */
-    .main-header {
-        text-align: center;
-        padding: 1.25rem;
-        margin-bottom: 1.25rem;
-        border-bottom: 2px solid #00ff9d40;
-        position: relative;
-        background: rgba(10, 10, 18, 0.7);
-        backdrop-filter: blur(5px);
-        border-radius: 8px;
-        box-shadow: 0 4px 12px rgba(0, 255, 157, 0.1);
-    }
-    
-    .main-header h1 {
-        font-family: 'Courier New', monospace;
-        font-size: 2.7rem;
-        font-weight: bold;
-        margin: 0;
-        color: #00ff9d;
-        text-shadow: 0 0 10px #00ff9d80, 0 0 20px #00ff9d40;
-        letter-spacing: 2px;
-    }
-    
-    .main-header p {
-        color: #00ccff;
-        margin: 0.4rem 0 0;
-        font-size: 1.1rem;
-        letter-spacing: 1px;
-        text-shadow: 0 0 5px #00ccff80, 0 0 10px #00ccff40;
-    }
-    
-    /* Chat title with enhanced tech look */
-    .chat-title {
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-        margin-bottom: 0.75rem;
-        padding: 0.75rem;
-        background: rgba(0, 255, 157, 0.05);
-        border-radius: 8px;
-        border: 1px solid #00ff9d40;
-        box-shadow: inset 0 0 8px rgba(0, 255, 157, 0.2);
-        backdrop-filter: blur(2px);
-    }
-    
-    .chat-title h1 {
-        margin: 0;
-        font-size: 1.5rem;
-    }
-    
-    /* Sidebar with circuit edge detail */
-    .stSidebar {
-        background-color: #1a1a2f;
-        border-right: 1px solid #00ff9d40;
-        box-shadow: inset -5px 0 15px rgba(0, 0, 0, 0.3);
-        background-image: 
-            linear-gradient(90deg, rgba(0, 255, 157, 0.03) 1px, transparent 1px),
-            linear-gradient(0deg, rgba(0, 255, 157, 0.03) 1px, transparent 1px);
-        background-size: 15px 15px;
-    }
-    
-    /* Text input with glow effect */
-    .stTextInput > div > div > input {
-        background-color: #2a2a4f;
-        color: #e0e0ff;
-        border: 1px solid #00ff9d40;
-        transition: all 0.3s ease;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border: 1px solid #00ff9d;
-        box-shadow: 0 0 10px rgba(0, 255, 157, 0.5);
-    }
-    
-    /* Markdown text */
-    .stMarkdown {
-        font-family: 'Courier New', monospace;
-    }
-    
-    /* Headers with reduced margins */
-    .stSidebar h1 {
-        margin-top: 0.5rem !important;
-        margin-bottom: 0.75rem !important;
-        font-size: 1.6rem !important;
-    }
-    
-    .stSidebar h2, .stSidebar h3 {
-        margin-top: 0.75rem !important;
-        margin-bottom: 0.5rem !important;
-    }
-    
-    /* Chat messages with enhanced styling */
-    .stChatMessage {
-        background-color: #1a1a2f;
-        border: 1px solid #00ff9d20;
-        border-radius: 5px;
-        padding: 8px;
-        margin: 4px 0;
-        box-shadow: 0 2px 5px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* Buttons with circuit-inspired hover effect */
-    .stButton > button {
-        background-color: #2a2a4f;
-        color: #00ff9d;
-        border: 1px solid #00ff9d;
-        border-radius: 5px;
-        transition: all 0.3s ease;
-        padding: 0.3rem 1rem !important;
-        white-space: nowrap !important;
-        display: inline-block !important;
-        min-width: 120px !important;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .stButton > button:hover {
-        background-color: #00ff9d20;
-        color: #00ff9d;
-        box-shadow: 0 0 15px rgba(0, 255, 157, 0.5);
-        border-color: #00ffbd;
-    }
-    
-    .stButton > button:hover:after {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: -50%;
-        width: 150%;
-        height: 100%;
-        background: linear-gradient(90deg, transparent, rgba(0, 255, 157, 0.2), transparent);
-        transform: skewX(-20deg);
-        animation: circuit-flow 1s linear;
-    }
-    
-    @keyframes circuit-flow {
-        0% { left: -50%; }
-        100% { left: 100%; }
-    }
-    
-    /* Fix for vertical text in button */
-    .clear-chat-btn span {
-        display: inline-block !important;
-        white-space: nowrap !important;
-    }
-    
-    /* Selectbox with tech styling */
-    .stSelectbox > div > div {
-        background-color: #2a2a4f;
-        border: 1px solid #00ff9d40;
-    }
-    
-    .stSelectbox > div > div:hover {
-        border-color: #00ff9d;
-        box-shadow: 0 0 8px rgba(0, 255, 157, 0.3);
-    }
-    
-    /* Smaller tab text */
-    button[data-baseweb="tab"] {
-        font-size: 0.85rem !important;
-        padding: 0.5rem 0.75rem !important;
-    }
-    
-    /* Expander padding */
-    .streamlit-expanderHeader {
-        font-size: 0.9rem;
-        padding: 0.5rem;
-    }
-    
-    /* Reduce caption size */
-    .caption {
-        font-size: 0.8rem !important;
-    }
-    
-    /* Header spacing */
-    h1, h2, h3 {
-        color: #00ff9d !important;
-        text-shadow: 0 0 10px #00ff9d40;
-        margin-top: 0.75rem !important;
-        margin-bottom: 0.5rem !important;
-    }
-    
-    /* Help text */
-    .helper-text {
-        font-size: 0.8rem !important;
-        padding-top: 0.25rem !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+timer = PhaseTimer()
+
+# Add custom CSS for a more compact interface (read from disk once per process)
+st.markdown(load_stylesheet(), unsafe_allow_html=True)
 
 # Add custom header
 st.markdown("""
@@ -230,65 +56,21 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Add JavaScript for visibility detection to handle auto-unload
-if 'auto_unload' in st.session_state and st.session_state.auto_unload:
-    # Custom handler for visibility change
-    st.markdown("""
-    <script>
-    document.addEventListener('visibilitychange', function() {
-        if (document.visibilityState === 'hidden') {
-            // When tab is hidden, trigger auto-unload
-            const data = new FormData();
-            data.append('data', 'unload_model');
-            // Use the streamlit's own fetch API to communicate with the server
-            window.parent.postMessage({type: 'streamlit:setComponentValue', value: 'unload_model'}, '*');
-        }
-    });
-    </script>
-    """, unsafe_allow_html=True)
-    
-    # Handle the visibility change with a custom component
-    def visibility_handler():
-        trigger = components.html(
-            """
-            <div id="visibility-trigger" style="display:none;"></div>
-            <script>
-            // This will be called when the component is created or updated
-            function sendMessageToStreamlit(e) {
-                if (e.data.type === 'streamlit:componentReady') {
-                    // Send any initial data
-                }
-            }
-            // Listen for messages from the parent frame
-            window.addEventListener('message', sendMessageToStreamlit);
-            </script>
-            """,
-            height=0,
-            key="visibility_handler"
-        )
-        
-        # Check if the model needs to be unloaded
-        if trigger == 'unload_model' and st.session_state.model:
-            # Only try to unload if auto_unload is enabled
-            if not st.session_state.get('auto_unload', False):
-                return
-                
-            # Only try to unload if we think it might be loaded
-            if check_model_loaded(st.session_state.model):
-                # Try to unload
-                unload_model(st.session_state.model)
-            else:
-                # Just update our state
-                st.session_state.model_loaded = False
-            # We don't rerun here because it would interrupt user's flow
-    
-    # Call the handler
-    visibility_handler()
+@st.cache_resource(show_spinner=False)
+def get_core():
+    """Process-wide NeuralNexus core shared by every session"""
+    return NeuralNexus()
+
+def get_catalog():
+    """Process-wide cache of installed models and their metadata"""
+    return get_core().catalog
+
+# Status labels for background model jobs
+JOB_LABELS = {LOAD: "Loading", UNLOAD: "Unloading"}
 
 def get_installed_models():
     try:
-        response = ollama.list()
-        return [model['name'] for model in response.get('models', [])]
+        return get_core().installed_models()
     except Exception as e:
         st.error(f"Error fetching models: {str(e)}")
         return []
@@ -301,86 +83,247 @@ def format_size(size_bytes):
         size_bytes /= 1024
     return f"{size_bytes:.2f} TB"
 
+def get_status_cache():
+    """Process-wide /api/ps snapshot shared by every session"""
+    return get_core().status
+
 def check_model_loaded(model_name):
-    """Check if a model is actually loaded in memory by making a simple API call"""
-    if not model_name:
-        return False
-    
+    """Check if a model is actually loaded in memory, using the shared status snapshot"""
+    return get_core().is_loaded(model_name)
+
+def get_policy():
+    """Process-wide model lifecycle policy (load options, keep_alive)"""
+    return get_core().policy
+
+def sidebar_load_options():
+    """Load options currently selected in the sidebar"""
+    return {
+        "num_ctx": st.session_state.context_length,
+        "num_gpu": st.session_state.num_gpu,
+        "num_thread": st.session_state.num_thread
+    }
+
+def get_manager():
+    """Process-wide registry of which sessions use which model"""
+    return get_core().manager
+
+def session_id():
+    """ID of the browser session running this script"""
+    return get_script_run_ctx().session_id
+
+def rerun_fragment():
+    """Redraw just the fragment being run, or the whole page during a full run"""
+    st.rerun(scope="fragment" if get_script_run_ctx().fragment_ids_this_run else "app")
+
+def effective_load_options(model_name):
+    """Load options for the next request to a model.
+
+    While the model is resident, keep the options it was loaded with (pinned
+    for this conversation) so a stray sidebar change doesn't force a reload.
+    Options of a model shared with other sessions can't be changed at all.
+    """
+    requested = sidebar_load_options()
+    if not check_model_loaded(model_name):
+        return requested
+    shared = get_manager().shared_load_options(session_id(), model_name)
+    pinned = st.session_state.load_options if model_name == st.session_state.model else None
+    return shared or pinned or get_policy().loaded_with(model_name) or requested
+
+def get_metrics():
+    """Process-wide latency and throughput metrics of recent replies"""
+    return get_core().metrics
+
+def get_jobs():
+    """Process-wide background runner for model loads and unloads"""
+    return get_core().jobs
+
+def get_residency():
+    """Process-wide view of resident models and their memory use"""
+    return get_core().residency
+
+def make_room(models):
+    """Unload idle models so `models` fit in the memory budget; returns what was unloaded"""
+    return get_core().make_room(session_id(), models)
+
+@st.cache_resource(show_spinner=False)
+def get_prewarmer():
+    """Process-wide background preloading driven by usage history"""
+    return Prewarmer(UsageHistory(), get_residency(), get_jobs(), get_status_cache(), get_policy())
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Process-wide on-disk cache of replies to deterministic prompts"""
+    return ResponseCache()
+
+def response_cache_key(model_name, options, history):
+    """Response cache key for a request, or None when its reply must not be cached"""
+    if not st.session_state.response_cache:
+        return None
+    # Sampling above temperature 0 is meant to vary, so only cache it when forced
+    if options["temperature"] > 0 and not st.session_state.response_cache_force:
+        return None
+    digest = get_catalog().models().get(model_name, {}).get("digest")
+    return cache_key(digest, options, history) if digest else None
+
+@st.cache_resource(show_spinner=False)
+def get_documents():
+    """Process-wide index of the user's documents"""
+    return DocumentIndex()
+
+def retrieve_documents(prompt):
+    """System message with the indexed excerpts most relevant to `prompt`, and their files"""
+    if not st.session_state.use_documents:
+        return None, []
     try:
-        # Use list running models to check if model is loaded
-        response = requests.get(
-            'http://localhost:11434/api/ps',
-            timeout=2.0  # Reasonable timeout
-        )
-        
-        if response.status_code != 200:
-            return False
-            
-        # Check if our model is in the list of running models 
-        data = response.json()
-        models = data.get('models', [])
-        
-        # Look for our model in the currently running models
-        for model in models:
-            if model.get('model') == model_name:
-                return True
-                
-        return False
+        results = get_documents().search(prompt)
     except Exception as e:
-        # Log the error for debugging but don't show in console
-        # print(f"Error checking model loaded status: {str(e)}")
-        # For any exception, assume model is not loaded
-        return False
+        st.warning(f"Couldn't search your documents ({e}); answering without them")
+        return None, []
+    if not results:
+        return None, []
+    return documents_message(results), sorted({result["path"] for result in results})
+
+def show_ingest(job):
+    """Progress or outcome of the latest indexing run"""
+    if job.state == "failed":
+        st.error(f"Indexing {job.root} failed: {job.error}")
+        return
+    label = (f"{job.files_done} / {job.files_total} files · {job.chunks_added} chunks embedded"
+             f" · {job.files_skipped} unchanged")
+    if job.running:
+        st.progress(job.fraction, text=label)
+        st.button("🔄 Refresh progress", key="refresh_ingest")
+    else:
+        st.caption(f"✓ {label} in {job.elapsed:.1f}s")
+    for path, error in job.failures.items():
+        st.caption(f"⚠️ {os.path.basename(path)}: {error}")
+
+def current_user():
+    """Who this session is, for conversations and usage habits: the `user` URL parameter, or the shared default user"""
+    return st.query_params.get("user", "anonymous")
 
 def unload_model(model_name):
-    """Unload a model from memory"""
-    try:
-        if model_name:
-            # First check if the model is actually loaded
-            if not check_model_loaded(model_name):
-                st.success(f"Model {model_name} is already unloaded")
-                st.session_state.model_loaded = False
-                return True
-            
-            # Use the keep_alive=0 parameter to unload the model
-            response = requests.post(
-                'http://localhost:11434/api/generate',
-                json={"model": model_name, "keep_alive": 0, "prompt": ""}
-            )
-            
-            # Wait a moment for unload to take effect
-            time.sleep(1)
-            
-            # Check if the model was actually unloaded
-            still_loaded = check_model_loaded(model_name)
-            
-            if not still_loaded:
-                st.success(f"Successfully unloaded {model_name} from memory")
-                # Directly update the session state
-                st.session_state.model_loaded = False
-                return True
-            else:
-                st.warning(f"Attempted to unload {model_name}, but it's still in memory")
-                st.session_state.model_loaded = True
-                return False
-    except Exception as e:
-        st.error(f"Error unloading model: {str(e)}")
+    """Start unloading a model from memory in the background"""
+    if not model_name:
         return False
+    
+    # First check if the model is actually loaded
+    if not check_model_loaded(model_name):
+        st.session_state.model_loaded = False
+        return True
+    
+    # Never pull a model out from under another session
+    started, reason = get_core().unload(session_id(), model_name)
+    if not started:
+        st.warning(f"Not unloading: {reason}")
+    return started
+
+def model_job_status(model_name):
+    """Markdown status line for a running or failed background job, if any"""
+    job = get_jobs().job(model_name)
+    if job is None:
+        return None
+    if job.running:
+        return f"⏳ Status: <span style='color:#ffcc00;font-weight:bold;'>{JOB_LABELS[job.action]}... ({job.elapsed:.0f}s)</span>"
+    if job.state == "failed":
+        return f"⚠️ Last {job.action} failed: {job.error}"
+    return None
+
+def get_downloads():
+    """Process-wide download manager shared by every session"""
+    return get_core().downloads
 
 def download_model(model_name):
-    """Download a model and show progress"""
-    try:
-        with st.spinner(f'Downloading {model_name}... This may take a while.'):
-            ollama.pull(model_name)
-        st.success(f'Successfully downloaded {model_name}!')
-        return True
-    except Exception as e:
-        st.error(f'Error downloading {model_name}: {str(e)}')
-        return False
+    """Start downloading a model in the background"""
+    get_core().download(model_name)
+    return True
 
-# Initialize session state
-if "messages" not in st.session_state:
+def show_download(download):
+    """Overall and per-layer progress for one download"""
+    if download.state == "failed":
+        st.error(f"{download.model}: {download.error}")
+        return
+    if download.state == "done":
+        st.caption(f"✓ {download.model} downloaded")
+        return
+    rate = download.bytes_per_second
+    label = f"{download.model}: {download.status}"
+    if download.total_bytes:
+        label += f" · {format_size(download.completed_bytes)} / {format_size(download.total_bytes)}"
+    if rate:
+        label += f" · {format_size(rate)}/s"
+    st.progress(download.fraction, text=label)
+    if len(download.layers) > 1:
+        with st.expander(f"{len(download.layers)} layers"):
+            for digest, layer in download.layers.items():
+                st.progress(layer["completed"] / layer["total"], text=digest[7:19])
+
+# Label of a conversation that isn't stored until its first message
+NEW_CONVERSATION = "New conversation"
+
+@st.cache_resource(show_spinner=False)
+def get_store():
+    """Process-wide on-disk conversation store"""
+    return ConversationStore()
+
+def open_conversation(conversation_id):
+    """Make a stored conversation (or a new one, for None) the active one, loading its newest messages"""
+    st.session_state.conversation_id = conversation_id
+    st.session_state.messages = (get_store().recent(conversation_id, HISTORY_LOAD_LIMIT, current_user())
+                                 if conversation_id is not None else [])
+    st.session_state.render_window = HISTORY_RENDER_WINDOW
+    st.session_state.load_options = None
+
+def new_conversation():
+    """Start a new conversation; it is stored once it gets its first message"""
+    open_conversation(None)
+
+def delete_conversation():
+    """Delete the active conversation and switch to the most recent remaining one"""
+    if st.session_state.conversation_id is not None:
+        get_store().delete(st.session_state.conversation_id, current_user())
+    remaining = get_store().conversations(current_user())
+    open_conversation(remaining[0][0] if remaining else None)
+
+def clear_conversation():
+    """Delete every message of the active conversation"""
+    get_store().clear(st.session_state.conversation_id, current_user())
     st.session_state.messages = []
+    st.session_state.load_options = None
+
+def add_message(message):
+    """Append a message to the active conversation, in memory and on disk"""
+    if st.session_state.conversation_id is None:
+        # The first prompt names the conversation
+        st.session_state.conversation_id = get_store().create(message["content"][:40], current_user())
+    get_store().append(st.session_state.conversation_id, message, current_user())
+    st.session_state.messages.append(message)
+
+def show_earlier_messages():
+    """Render one more page of history, loading older messages from disk if needed"""
+    st.session_state.render_window += HISTORY_RENDER_WINDOW
+    missing = st.session_state.render_window - len(st.session_state.messages)
+    if missing > 0 and st.session_state.messages:
+        older = get_store().recent(
+            st.session_state.conversation_id, missing, current_user(),
+            before_id=st.session_state.messages[0]["id"]
+        )
+        st.session_state.messages = older + st.session_state.messages
+
+def check_conversation():
+    """Stay on a conversation of this owner that still exists; another session may have deleted ours.
+
+    Returns the stored conversations for the picker.
+    """
+    conversations = get_store().conversations(current_user())
+    # None is a new conversation that hasn't been stored yet
+    valid = {conversation_id for conversation_id, _ in conversations} | {None}
+    if st.session_state.get("conversation_id", "") not in valid:
+        open_conversation(conversations[0][0] if conversations else None)
+    return conversations
+
+# Initialize session state
+conversations = check_conversation()
 if "model" not in st.session_state:
     st.session_state.model = None
 if "temperature" not in st.session_state:
@@ -391,25 +334,37 @@ if "num_gpu" not in st.session_state:
     st.session_state.num_gpu = 1
 if "num_thread" not in st.session_state:
     st.session_state.num_thread = 4
+if "response_cache" not in st.session_state:
+    st.session_state.response_cache = RESPONSE_CACHE
+if "response_cache_force" not in st.session_state:
+    st.session_state.response_cache_force = False
+if "use_documents" not in st.session_state:
+    st.session_state.use_documents = False
 if "auto_unload" not in st.session_state:
-    st.session_state.auto_unload = False
+    st.session_state.auto_unload = IDLE_UNLOAD_TIMEOUT > 0
 if "model_loaded" not in st.session_state:
     st.session_state.model_loaded = True
-if "visibility_state" not in st.session_state:
-    st.session_state.visibility_state = "visible"
-if "just_loaded_model" not in st.session_state:
-    st.session_state.just_loaded_model = False
+if "status_version" not in st.session_state:
+    # Status events from before this session started aren't news to it
+    st.session_state.status_version = get_core().watcher.version
+if "load_options" not in st.session_state:
+    st.session_state.load_options = None
 
 # Callback for auto-unload toggle
 def on_auto_unload_change():
-    if st.session_state.auto_unload_toggle:
-        st.session_state.auto_unload = True
-    else:
-        st.session_state.auto_unload = False
+    st.session_state.auto_unload = st.session_state.auto_unload_toggle
+    # The idle unloader reads the choice from the manager, not from this session
+    get_manager().touch(session_id(), st.session_state.model, auto_unload=st.session_state.auto_unload)
 
 # Get installed models
 installed_models = get_installed_models()
 
+# A new session starts on (and prewarms) the model this user most likely wants right now
+if st.session_state.model is None and installed_models:
+    st.session_state.model = get_prewarmer().prewarm_predicted(
+        session_id(), current_user(), installed_models, sidebar_load_options()
+    )
+
 # Popular models list
 POPULAR_MODELS = {
     "llama2": "Meta's LLaMA 2 model - Good all-rounder",
@@ -422,10 +377,389 @@ POPULAR_MODELS = {
     "deepseek": "DeepSeek Coder - Excellent for code generation and completion",
 }
 
+def show_sidebar_status():
+    """Model size and load status under the model picker"""
+    try:
+        size = get_catalog().models().get(st.session_state.model, {}).get('size')
+    except Exception:
+        size = None
+    if size:
+        st.caption(f"Model size: {format_size(size)}")
+    
+    try:
+        # Check actual model status and update session state
+        actual_loaded_state = check_model_loaded(st.session_state.model)
+        
+        # If our state doesn't match reality, update it silently
+        if actual_loaded_state != st.session_state.get('model_loaded', False):
+            st.session_state.model_loaded = actual_loaded_state
+        
+        # Show load status with clear visual indicators
+        if get_jobs().running(st.session_state.model):
+            st.markdown(model_job_status(st.session_state.model), unsafe_allow_html=True)
+        elif actual_loaded_state:
+            st.markdown("📊 Status: <span style='color:#00ff9d;font-weight:bold;'>Loaded in memory</span>", unsafe_allow_html=True)
+        else:
+            st.markdown("💤 Status: <span style='color:#ff9d9d;font-weight:bold;'>Unloaded from memory</span>", unsafe_allow_html=True)
+    except Exception:
+        # If we can't check the status, show unknown
+        st.markdown("❓ Status: <span style='color:#ffcc00;font-weight:bold;'>Unknown</span>", unsafe_allow_html=True)
+
+@st.fragment
+def show_memory_controls():
+    """Unload button reflecting the model's actual load state"""
+    actual_loaded_state = check_model_loaded(st.session_state.model)
+    
+    # Always show the button, but change its appearance based on load state
+    running_job = get_jobs().running(st.session_state.model)
+    if running_job:
+        st.button(f"⏳ {JOB_LABELS[running_job.action]}...",
+                help="Waiting for Ollama to finish",
+                disabled=True)
+    elif actual_loaded_state:
+        # Model is loaded - show unload button
+        if st.button("⚡ Unload Model", 
+                     help="Unload the model from memory to free up resources",
+                     type="primary"):
+            if unload_model(st.session_state.model):
+                rerun_fragment()
+    else:
+        # Model is already unloaded - show disabled-style button
+        st.button("✓ Model Unloaded", 
+                help="This model is already unloaded from memory",
+                disabled=True)
+
+@st.fragment
+def show_memory_panel():
+    """Resident models, their memory use against the budget, and per-model unload"""
+    residency = get_residency()
+    resident = residency.resident()
+    used = sum(model.size for model in resident)
+    if residency.budget:
+        st.progress(min(1.0, used / residency.budget),
+                    text=f"{format_size(used)} of {format_size(residency.budget)} in use")
+    else:
+        st.caption(f"{format_size(used)} in use (no memory budget set)")
+    if not resident:
+        st.caption("No models in memory")
+    for model in resident:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            details = f"{format_size(model.size)} · {model.vram_fraction:.0%} GPU"
+            if model.expires_in is not None:
+                details += f" · unloads in {model.expires_in / 60:.0f} min"
+            st.markdown(f"**{model.name}**")
+            st.caption(details)
+        with col2:
+            job = get_jobs().running(model.name)
+            if st.button("⏏", key=f"evict_{model.name}", help=f"Unload {model.name}", disabled=bool(job)):
+                if unload_model(model.name):
+                    rerun_fragment()
+
+def show_load_warning():
+    """Warn before a settings change throws away the loaded model and its prompt cache"""
+    pending_changes = changed_load_options(
+        effective_load_options(st.session_state.model), sidebar_load_options()
+    )
+    if pending_changes and get_manager().shared_load_options(session_id(), st.session_state.model):
+        st.info(f"{st.session_state.model} is shared with other sessions, so {', '.join(pending_changes)} "
+                "stays as loaded until they are done with it.")
+    elif pending_changes:
+        st.warning(f"Changing {', '.join(pending_changes)} reloads the model and discards its prompt cache.")
+        if st.button("Apply and reload", key="apply_load_options"):
+            st.session_state.load_options = sidebar_load_options()
+            rerun_fragment()
+
+def show_model_details(model_info):
+    """Detailed model information - more compact"""
+    if isinstance(model_info, dict):
+        st.markdown("##### Model Info")
+        st.markdown(f"**Name:** {st.session_state.model}")
+        if 'modified_at' in model_info:
+            st.markdown(f"**Modified:** {model_info['modified_at']}")
+        if 'details' in model_info:
+            details = model_info['details']
+            st.markdown(f"**Format:** {details.get('format', 'N/A')}")
+
+STATUS_TOASTS = {
+    LOADED: "📊 {model} is loaded",
+    UNLOADED: "💤 {model} was unloaded",
+}
+
+def show_status_events():
+    """Toast the status watcher's news about this session's model since it last looked"""
+    events = get_core().watcher.events_since(st.session_state.status_version)
+    for event in events:
+        if event.model == st.session_state.model and event.kind in STATUS_TOASTS:
+            st.toast(STATUS_TOASTS[event.kind].format(model=event.model))
+    if events:
+        st.session_state.status_version = events[-1].version
+
+def status_signature():
+    """What the status panels show that can change without this session doing anything"""
+    resident = frozenset(model.name for model in get_residency().resident())
+    running = frozenset(model for model in resident | {st.session_state.model} if get_jobs().running(model))
+    downloading = frozenset(download.model for download in get_downloads().downloads() if download.active)
+    return resident, running, downloading, frozenset(get_installed_models())
+
+@st.fragment(run_every=STATUS_REFRESH_INTERVAL)
+def show_status_row():
+    """Status indicator in the main chat area, redrawn on a timer from the status watcher's snapshot.
+
+    This is the only status section on a timer: the others are drawn with
+    the page, which it reruns when what they show has changed.
+    """
+    if status_signature() != st.session_state.get("status_drawn"):
+        st.rerun()
+    show_status_events()
+    if not st.session_state.auto_unload:
+        # An open tab that opted out of auto-unload keeps holding its model, active or not
+        get_manager().seen(session_id())
+    if not st.session_state.model:
+        return
+    status_col1, status_col2 = st.columns([1, 4])
+    with status_col1:
+        loaded = check_model_loaded(st.session_state.model)
+        running_job = get_jobs().running(st.session_state.model)
+        if running_job:
+            st.markdown(f"⏳ <span style='color:#ffcc00;font-weight:bold;'>Model Status: {JOB_LABELS[running_job.action]}</span>", unsafe_allow_html=True)
+        elif loaded:
+            st.markdown("📊 <span style='color:#00ff9d;font-weight:bold;'>Model Status: Loaded</span>", unsafe_allow_html=True)
+        else:
+            st.markdown("💤 <span style='color:#ff9d9d;font-weight:bold;'>Model Status: Unloaded</span>", unsafe_allow_html=True)
+    with status_col2:
+        if running_job:
+            # The job runs on its own; the next redraw picks up its latest state
+            st.caption(f"{JOB_LABELS[running_job.action]} for {running_job.elapsed:.0f}s")
+        elif not loaded:
+            if st.button("⚡ Load Model Now", help="Preload the model in the background without waiting for chat"):
+                # Making room happens in the job too, so the redraw isn't held up by unloads
+                get_core().load(session_id(), st.session_state.model,
+                                options=effective_load_options(st.session_state.model))
+                rerun_fragment()
+            job_status = model_job_status(st.session_state.model)
+            if job_status:
+                st.caption(job_status)
+
+def show_downloads():
+    """Progress of running and recent downloads, redrawn on a timer while one is running"""
+    active = any(download.active for download in get_downloads().downloads())
+    st.fragment(show_download_progress, run_every=STATUS_REFRESH_INTERVAL if active else None)()
+
+def show_download_progress():
+    downloads = get_downloads().downloads()
+    if downloads:
+        st.markdown("#### Downloads")
+        for download in downloads:
+            show_download(download)
+
+@st.fragment
+def show_download_picker():
+    """Popular and custom model downloads"""
+    # Popular models download - more compact
+    st.markdown("#### Popular Models")
+    for model_name, description in POPULAR_MODELS.items():
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**{model_name}**")
+            st.caption(description)
+        with col2:
+            download = get_downloads().get(model_name)
+            if download and download.active:
+                st.markdown("⏳")
+            elif model_name not in installed_models:
+                if st.button("📥", key=f"download_{model_name}", help=f"Download {model_name}"):
+                    if download_model(model_name):
+                        rerun_fragment()
+            else:
+                st.markdown("✓")
+    
+    # Custom model download
+    st.markdown("#### Custom Model")
+    custom_model = st.text_input("Model name", placeholder="e.g., orca-mini")
+    if custom_model:
+        if st.button("Download"):
+            if download_model(custom_model):
+                rerun_fragment()
+
+@st.fragment
+def show_settings():
+    """Generation and hardware settings; changing them redraws only this section"""
+    # Settings changes count as activity in this session
+    get_manager().touch(session_id(), st.session_state.model, auto_unload=st.session_state.auto_unload)
+    
+    # Auto-unload toggle, handled on the server by the idle unloader
+    if IDLE_UNLOAD_TIMEOUT > 0:
+        auto_unload_help = (f"Unload the model once every session using it has been idle for "
+                            f"{IDLE_UNLOAD_TIMEOUT / 60:.0f} min; it reloads when you chat. "
+                            "Turn off to keep it loaded while this tab is open")
+    else:
+        auto_unload_help = "Idle unloading is turned off on this server"
+    st.toggle(
+        "Auto-unload when idle", 
+        value=st.session_state.get('auto_unload', False),
+        key="auto_unload_toggle",
+        on_change=on_auto_unload_change,
+        disabled=IDLE_UNLOAD_TIMEOUT <= 0,
+        help=auto_unload_help
+    )
+    
+    # Generation settings
+    st.markdown("##### Generation")
+    # Widgets keep their values under these session state keys
+    st.slider(
+        "Temperature",
+        min_value=0.0,
+        max_value=2.0,
+        key="temperature",
+        help="Higher = more random, lower = more deterministic"
+    )
+    
+    st.toggle(
+        "💾 Cache deterministic replies",
+        key="response_cache",
+        help="At temperature 0, replay the stored reply to an identical prompt instead of generating it again"
+    )
+    st.checkbox(
+        "Cache at any temperature",
+        key="response_cache_force",
+        disabled=not st.session_state.response_cache,
+        help="Also cache replies sampled above temperature 0; repeated prompts then always get the same answer"
+    )
+    
+    st.slider(
+        "Context Length",
+        min_value=512,
+        max_value=8192,
+        step=512,
+        key="context_length",
+        help="Number of tokens to consider for context"
+    )
+    
+    # Hardware settings
+    st.markdown("##### Hardware")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.number_input(
+            "GPUs",
+            min_value=0,
+            max_value=8,
+            key="num_gpu",
+            help="Number of GPUs to use (0 for CPU only)"
+        )
+    
+    with col2:
+        st.number_input(
+            "Threads",
+            min_value=1,
+            max_value=16,
+            key="num_thread",
+            help="Number of CPU threads to use"
+        )
+    
+    # Reload warning and detailed model information
+    show_load_warning()
+    model_info = None
+    try:
+        model_info = get_catalog().info(st.session_state.model)
+    except Exception:
+        pass
+    show_model_details(model_info)
+
+@st.fragment
+def show_documents():
+    """Indexing controls and the switch for answering from local documents"""
+    documents = get_documents()
+    document_stats = documents.stats()
+    st.toggle(
+        "Answer from my documents",
+        key="use_documents",
+        disabled=not document_stats["chunks"],
+        help="Adds the most relevant passages of your indexed files to each prompt"
+    )
+    folder = st.text_input("File or folder", placeholder="e.g., ~/notes")
+    ingest_job = documents.job
+    indexing = ingest_job is not None and ingest_job.running
+    if st.button("📥 Index", disabled=not folder or indexing, use_container_width=True,
+                 help="Only new and changed files are embedded again"):
+        documents.ingest(folder)
+        rerun_fragment()
+    if ingest_job:
+        show_ingest(ingest_job)
+    if document_stats["files"]:
+        st.caption(f"{document_stats['files']} files · {document_stats['chunks']} chunks "
+                   f"({format_size(document_stats['bytes'])}) embedded with {EMBED_MODEL}")
+        if st.button("Clear index", disabled=indexing, use_container_width=True):
+            documents.clear()
+            rerun_fragment()
+
+@st.fragment
+def show_performance():
+    """Latency and throughput of recent replies per model, with exports"""
+    summary = get_metrics().summary()
+    if summary:
+        rows = "\n".join(
+            f"| {row['model']} | {row['replies']} | {row['ttft_p50']:.2f}s / {row['ttft_p95']:.2f}s "
+            f"| {row['tps_p50']:.1f} | {row['cold_loads']} × {row['cold_load_p50']:.1f}s "
+            f"| {row['warm_load_p50']:.2f}s |"
+            for row in summary
+        )
+        st.markdown("| Model | Replies | TTFT p50 / p95 | tok/s | Cold loads | Warm load |\n"
+                    "|---|---|---|---|---|---|\n" + rows)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Prometheus", get_metrics().prometheus(),
+                               file_name="neuralnexus.prom", mime="text/plain",
+                               use_container_width=True)
+        with col2:
+            st.download_button("JSONL", get_metrics().jsonl(),
+                               file_name="neuralnexus-metrics.jsonl", mime="application/jsonl",
+                               use_container_width=True)
+    else:
+        st.caption("No replies measured yet")
+    cache_stats = get_response_cache().stats()
+    if cache_stats["replies"]:
+        st.caption(f"Response cache: {cache_stats['replies']} replies ({format_size(cache_stats['bytes'])}), "
+                   f"replayed {cache_stats['hits']} times")
+    outcomes = get_prewarmer().history.outcomes()
+    if outcomes:
+        st.caption("Prewarm: " + " · ".join(
+            f"{reason} {counts['hit']} used / {counts['wasted']} wasted"
+            for reason, counts in sorted(outcomes.items())
+        ))
+
+timer.mark("setup")
+
 # Sidebar for model selection and configuration - more compact layout
 with st.sidebar:
     st.title("⚡ NeuralNexus Settings")
     
+    # Conversation picker
+    st.subheader("Conversations")
+    conversation_ids = [conversation_id for conversation_id, _ in conversations]
+    conversation_names = dict(conversations)
+    if st.session_state.conversation_id is None:
+        conversation_ids.insert(0, None)
+        conversation_names[None] = NEW_CONVERSATION
+    selected_conversation = st.selectbox(
+        "Conversation",
+        conversation_ids,
+        index=conversation_ids.index(st.session_state.conversation_id),
+        format_func=lambda conversation_id: conversation_names[conversation_id],
+        label_visibility="collapsed"
+    )
+    if selected_conversation != st.session_state.conversation_id:
+        open_conversation(selected_conversation)
+    col1, col2 = st.columns(2)
+    with col1:
+        # Callbacks instead of st.rerun() here, which would stop the run before
+        # the settings below are drawn and reset them
+        st.button("➕ New", key="new_conversation", help="Start a new conversation", on_click=new_conversation)
+    with col2:
+        st.button("🗑️ Delete", key="delete_conversation", help="Delete this conversation",
+                  on_click=delete_conversation)
+    
     # Model management section - more compact
     st.subheader("Model Management")
     
@@ -443,57 +777,29 @@ with st.sidebar:
             installed_models,
             index=0 if st.session_state.model is None else installed_models.index(st.session_state.model)
         )
+        get_manager().touch(session_id(), st.session_state.model, auto_unload=st.session_state.auto_unload)
         
-        # Basic model info - always visible
-        try:
-            model_info = ollama.show(st.session_state.model)
-            if isinstance(model_info, dict) and 'size' in model_info:
-                st.caption(f"Model size: {format_size(model_info['size'])}")
-            
-            # Only check actual loaded status if we have a stable connection
-            try:
-                # Check actual model status and update session state
-                actual_loaded_state = check_model_loaded(st.session_state.model)
-                
-                # If our state doesn't match reality, update it silently
-                if actual_loaded_state != st.session_state.get('model_loaded', False):
-                    st.session_state.model_loaded = actual_loaded_state
-                
-                # Show load status with clear visual indicators
-                if actual_loaded_state:
-                    st.markdown("📊 Status: <span style='color:#00ff9d;font-weight:bold;'>Loaded in memory</span>", unsafe_allow_html=True)
-                else:
-                    st.markdown("💤 Status: <span style='color:#ff9d9d;font-weight:bold;'>Unloaded from memory</span>", unsafe_allow_html=True)
-            except Exception:
-                # If we can't check the status, show unknown
-                st.markdown("❓ Status: <span style='color:#ffcc00;font-weight:bold;'>Unknown</span>", unsafe_allow_html=True)
-                
-        except Exception:
-            pass
+        # Start loading a newly picked model while the user types
+        if st.session_state.get("previous_model", st.session_state.model) != st.session_state.model:
+            get_prewarmer().prewarm_selected(
+                session_id(), st.session_state.model, effective_load_options(st.session_state.model)
+            )
+        st.session_state.previous_model = st.session_state.model
+        
+        # Optional models that answer every prompt alongside the selected one
+        st.session_state.compare_models = st.multiselect(
+            "⚖️ Compare with",
+            [model for model in installed_models if model != st.session_state.model],
+            max_selections=MAX_COMPARE_MODELS - 1,
+            help="Send each prompt to these models too and show the replies side by side"
+        )
+        
+        # Basic model info and load status, filled in after the chat area
+        model_status_slot = st.container()
     
     with tab2:
-        # Popular models download - more compact
-        st.markdown("#### Popular Models")
-        for model_name, description in POPULAR_MODELS.items():
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.markdown(f"**{model_name}**")
-                st.caption(description)
-            with col2:
-                if model_name not in installed_models:
-                    if st.button("📥", key=f"download_{model_name}", help=f"Download {model_name}"):
-                        if download_model(model_name):
-                            st.rerun()
-                else:
-                    st.markdown("✓")
-        
-        # Custom model download
-        st.markdown("#### Custom Model")
-        custom_model = st.text_input("Model name", placeholder="e.g., orca-mini")
-        if custom_model:
-            if st.button("Download"):
-                if download_model(custom_model):
-                    st.rerun()
+        show_downloads()
+        show_download_picker()
 
     st.markdown("---")
     
@@ -504,83 +810,22 @@ with st.sidebar:
         # Memory management section
         st.markdown("##### Memory Management")
         
-        # Unload button
-        # First check actual model status
-        actual_loaded_state = check_model_loaded(st.session_state.model)
+        # Unload button, filled in after the chat area
+        memory_slot = st.container()
         
-        # Always show the button, but change its appearance based on load state
-        if actual_loaded_state:
-            # Model is loaded - show unload button
-            if st.button("⚡ Unload Model", 
-                         help="Unload the model from memory to free up resources",
-                         type="primary"):
-                if unload_model(st.session_state.model):
-                    st.rerun()
-        else:
-            # Model is already unloaded - show disabled-style button
-            st.button("✓ Model Unloaded", 
-                    help="This model is already unloaded from memory",
-                    disabled=True)
-        
-        # Auto-unload toggle
-        st.toggle(
-            "Auto-unload when inactive", 
-            value=st.session_state.get('auto_unload', False),
-            key="auto_unload_toggle",
-            on_change=on_auto_unload_change,
-            help="Automatically unload the model when you navigate away and reload when you chat"
-        )
-        
-        # Generation settings
-        st.markdown("##### Generation")
-        st.session_state.temperature = st.slider(
-            "Temperature",
-            min_value=0.0,
-            max_value=2.0,
-            value=0.7,
-            help="Higher = more random, lower = more deterministic"
-        )
-        
-        st.session_state.context_length = st.slider(
-            "Context Length",
-            min_value=512,
-            max_value=8192,
-            value=4096,
-            step=512,
-            help="Number of tokens to consider for context"
-        )
-        
-        # Hardware settings
-        st.markdown("##### Hardware")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.session_state.num_gpu = st.number_input(
-                "GPUs",
-                min_value=0,
-                max_value=8,
-                value=1,
-                help="Number of GPUs to use (0 for CPU only)"
-            )
-        
-        with col2:
-            st.session_state.num_thread = st.number_input(
-                "Threads",
-                min_value=1,
-                max_value=16,
-                value=4,
-                help="Number of CPU threads to use"
-            )
-        
-        # Detailed model information - more compact
-        if isinstance(model_info, dict):
-            st.markdown("##### Model Info")
-            st.markdown(f"**Name:** {st.session_state.model}")
-            if 'modified_at' in model_info:
-                st.markdown(f"**Modified:** {model_info['modified_at']}")
-            if 'details' in model_info:
-                details = model_info['details']
-                st.markdown(f"**Format:** {details.get('format', 'N/A')}")
+        show_settings()
+    
+    # Local documents the model can answer from
+    with st.expander("📚 Documents"):
+        show_documents()
+    
+    # Resident models and memory use, filled in after the chat area
+    with st.expander("🧠 Memory"):
+        memory_panel_slot = st.container()
+    
+    # Latency and throughput of recent replies, per model
+    with st.expander("📈 Performance"):
+        show_performance()
     
     # More compact about section
     st.markdown("---")
@@ -589,6 +834,8 @@ with st.sidebar:
     Select a model and initiate neural connection.
     """)
 
+timer.mark("sidebar")
+
 # Main chat interface - more compact
 st.markdown("""
     <div class="chat-title">
@@ -596,117 +843,276 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Check if we need to refresh the status (model was just loaded in previous interaction)
-if st.session_state.get('just_loaded_model', False):
-    # Clear the flag
-    st.session_state.just_loaded_model = False
-    # Give the UI a moment to update first
-    st.rerun()
+# Status indicator in the main chat area, filled in after the chat messages
+status_slot = st.container()
 
-# Add status indicator in the main chat area that updates with each interaction
-if st.session_state.model:
-    status_col1, status_col2 = st.columns([1, 4])
-    with status_col1:
-        loaded = check_model_loaded(st.session_state.model)
-        if loaded:
-            st.markdown("📊 <span style='color:#00ff9d;font-weight:bold;'>Model Status: Loaded</span>", unsafe_allow_html=True)
+def context_caption(message):
+    """Caption describing how much history was sent with a reply"""
+    caption = f"~{message['context_tokens']} tokens sent"
+    if message.get("trimmed"):
+        caption += f" · {message['trimmed']} older messages trimmed to fit the context window"
+    return caption
+
+# Display chat messages, only the most recent window eagerly
+visible_messages = st.session_state.messages[-st.session_state.render_window:]
+hidden_messages = get_store().count(st.session_state.conversation_id, current_user()) - len(visible_messages)
+if hidden_messages > 0:
+    st.button(f"⬆️ Show earlier messages ({hidden_messages} more)", key="show_earlier",
+              on_click=show_earlier_messages)
+def sources_caption(sources):
+    """Caption naming the documents a reply was given excerpts of"""
+    return "📚 " + ", ".join(os.path.basename(path) for path in sources)
+
+def show_message_body(message):
+    """Content of a stored message and its captions"""
+    st.markdown(message["content"])
+    if "context_tokens" in message:
+        st.caption(context_caption(message))
+    if "metrics" in message:
+        st.caption(metrics_caption(message["metrics"]))
+    if message.get("cached"):
+        st.caption("💾 Replayed from the response cache")
+    if message.get("sources"):
+        st.caption(sources_caption(message["sources"]))
+
+def comparison_groups(messages):
+    """Group consecutive replies of one comparison; other messages stand alone"""
+    groups = []
+    for message in messages:
+        if "compare" in message and groups and groups[-1][0].get("compare") == message["compare"]:
+            groups[-1].append(message)
         else:
-            st.markdown("💤 <span style='color:#ff9d9d;font-weight:bold;'>Model Status: Unloaded</span>", unsafe_allow_html=True)
-    with status_col2:
-        if not loaded and st.button("⚡ Load Model Now", help="Preload the model without waiting for chat"):
-            # Try to load the model with a simple request
-            try:
-                requests.post(
-                    'http://localhost:11434/api/generate',
-                    json={"model": st.session_state.model, "prompt": " ", "stream": False},
-                    timeout=1
-                )
-                st.session_state.model_loaded = True
-                st.experimental_rerun()
-            except:
-                st.error("Failed to load model. Try chatting to automatically load it.")
+            groups.append([message])
+    return groups
+
+for group in comparison_groups(visible_messages):
+    with st.chat_message(group[0]["role"]):
+        if "compare" not in group[0]:
+            show_message_body(group[0])
+            continue
+        for message, column in zip(group, st.columns(len(group))):
+            with column:
+                st.markdown(f"**{message['model']}**")
+                show_message_body(message)
+
+def run_comparison(models, group, context=None, sources=()):
+    """Stream the latest prompt to several models side by side and store each reply.
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+    Models that fit in memory together (judged from /api/ps) run at the same
+    time; the rest follow in later rounds so they don't evict each other.
+    `context` is a system message of document excerpts sent to every model.
+    """
+    residency = get_residency()
+    resident = {model.name: model.size for model in residency.resident()}
+    sizes = {model: residency.footprint(model) for model in models}
+    batches = plan_batches(models, sizes, resident, comparison_budget(resident, sizes, residency.budget))
+    if len(batches) > 1:
+        st.caption(f"Running in {len(batches)} rounds so the models fit in memory")
+    
+    replies, renderers, columns = {}, {}, {}
+    for model, column in zip(models, st.columns(len(models))):
+        with column:
+            st.markdown(f"**{model}**")
+            renderers[model] = StreamRenderer(st.container())
+        columns[model] = column
+        replies[model] = {"role": "assistant", "model": model, "compare": group}
+        if sources:
+            replies[model]["sources"] = list(sources)
+    
+    for batch in batches:
+        # Room for the whole round at once, so its models don't evict each other
+        make_room(batch)
+        streams = {}
+        with ExitStack() as stack:
+            for model in batch:
+                load_options = effective_load_options(model)
+                history, replies[model]["context_tokens"], replies[model]["trimmed"] = fit_history(
+                    ([context] if context else []) + model_history(st.session_state.messages, model),
+                    load_options["num_ctx"]
+                )
+                get_prewarmer().history.record_request(current_user(), model)
+                try:
+                    streams[model] = get_core().start_chat(
+                        session_id(), model, history,
+                        options={"temperature": st.session_state.temperature, **load_options}
+                    )
+                except QueueFull as e:
+                    renderers[model].tail.warning(f"NeuralNexus is busy right now ({e})")
+                    continue
+                # Stops the streams if this script run is interrupted mid-reply
+                stack.callback(streams[model].cancel)
+            
+            # Interleave the streams in this one script run
+            pending = dict(streams)
+            while pending:
+                for model, stream in list(pending.items()):
+                    renderer = renderers[model]
+                    try:
+                        chunks, finished = stream.drain()
+                    except Exception as e:
+                        renderer.tail.error(f"Error: {e}")
+                        del pending[model]
+                        continue
+                    if stream.queued:
+                        renderer.tail.info(f"Waiting for a free slot... (position {stream.position} in queue)")
+                    for chunk in chunks:
+                        renderer.feed(chunk.get('message', {}).get('content'))
+                    if finished:
+                        del pending[model]
+                if pending:
+                    time.sleep(0.02)
+        
+        for model, stream in streams.items():
+            reply = replies[model]
+            if not stream.done:
+                continue
+            reply["content"] = renderers[model].finish()
+            set_message_tokens(reply, stream.done.get('eval_count'))
+            reply["metrics"] = stream.record(render_seconds=renderers[model].render_seconds)
+            with columns[model]:
+                st.caption(context_caption(reply))
+                st.caption(metrics_caption(reply["metrics"]))
+                if sources:
+                    st.caption(sources_caption(sources))
+    
+    # Only complete replies are kept; failed ones showed their error above
+    for model in models:
+        if "content" in replies[model]:
+            add_message(replies[model])
+    get_status_cache().invalidate()
 
 # Chat input
 if prompt := st.chat_input("What would you like to ask?"):
     # Add user message to chat history first
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Get AI response
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
-        
-        try:
-            # Check if model is available
-            model_loaded = check_model_loaded(st.session_state.model)
-            if not model_loaded:
-                # Show loading message
-                message_placeholder.info(f"Model {st.session_state.model} is being loaded...")
-            
-            # Stream the response with configuration
-            stream = ollama.chat(
-                model=st.session_state.model,
-                messages=[{"role": m["role"], "content": m["content"]} for m in st.session_state.messages],
-                stream=True,
-                options={
-                    "temperature": st.session_state.temperature,
-                    "num_ctx": st.session_state.context_length,
-                    "num_gpu": st.session_state.num_gpu,
-                    "num_thread": st.session_state.num_thread
-                }
-            )
-            
-            # If we get here, the model is loaded
-            st.session_state.model_loaded = True
-            
-            # Set a flag to indicate we've just loaded the model
-            if not model_loaded:
-                st.session_state.just_loaded_model = True
-            
-            for chunk in stream:
-                if chunk.get('message', {}).get('content'):
-                    full_response += chunk['message']['content']
-                    message_placeholder.markdown(full_response + "▌")
-                    time.sleep(0.01)
-            
-            message_placeholder.markdown(full_response)
+    # Only the indexed passages relevant to this prompt go to the model
+    context, sources = retrieve_documents(prompt)
+
+    # Get AI responses side by side when comparing models
+    compare_models = [st.session_state.model] + st.session_state.compare_models
+    if len(compare_models) > 1:
+        with st.chat_message("assistant"):
+            run_comparison(compare_models, group=st.session_state.messages[-1]["id"],
+                           context=context, sources=sources)
+    else:
+        # Get AI response
+        with st.chat_message("assistant"):
+            renderer = StreamRenderer(st.container())
+            full_response = ""
+            reply = {"role": "assistant"}
+            if sources:
+                reply["sources"] = sources
             
-            # After a successful response, ensure model status is up to date
-            if not model_loaded:
-                # We loaded the model during this interaction
-                st.session_state.just_loaded_model = True
+            try:
+                # Keep load options stable for the conversation to reuse the loaded runner
+                load_options = effective_load_options(st.session_state.model)
+                st.session_state.load_options = load_options
+                options = {"temperature": st.session_state.temperature, **load_options}
                 
-                # Add assistant response to chat history before rerunning
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+                # Send only as much history as fits in the context window
+                history, reply["context_tokens"], reply["trimmed"] = fit_history(
+                    ([context] if context else []) + model_history(st.session_state.messages, st.session_state.model),
+                    load_options["num_ctx"]
+                )
                 
-                # Force an immediate rerun to update all status indicators
-                st.rerun()
-            
-        except Exception as e:
-            error_msg = str(e)
-            st.error(f"Error: {error_msg}")
+                # An identical deterministic request answered before is replayed from the cache
+                reply_cache_key = response_cache_key(st.session_state.model, options, history)
+                cached = get_response_cache().get(reply_cache_key) if reply_cache_key else None
+                
+                # Check if model is available (a cached reply doesn't need it)
+                model_loaded = cached is not None or check_model_loaded(st.session_state.model)
+                if cached is None:
+                    if not model_loaded:
+                        renderer.tail.info(f"Model {st.session_state.model} is being loaded...")
+                    get_prewarmer().history.record_request(current_user(), st.session_state.model)
+                    # The core makes room for the model and queues the request; other
+                    # sessions can't unload the model until the stream is cancelled
+                    generation = get_core().start_chat(session_id(), st.session_state.model, history, options)
+                    if generation.evicted:
+                        st.caption(f"Unloaded {', '.join(generation.evicted)} to make room")
+                else:
+                    generation = cached
+                try:
+                    # Show our place in line while other requests are served
+                    while not generation.wait_started(timeout=0.5):
+                        renderer.tail.info(f"Waiting for a free slot on {st.session_state.model}... "
+                                           f"(position {generation.position} in queue)")
+                    if not model_loaded:
+                        renderer.tail.info(f"Model {st.session_state.model} is being loaded...")
+                    
+                    done = None
+                    for chunk in generation:
+                        renderer.feed(chunk.get('message', {}).get('content'))
+                        if chunk.get('done'):
+                            done = chunk
+                            set_message_tokens(reply, chunk.get('eval_count'))
+                finally:
+                    # Stops the stream if this script run is interrupted mid-reply
+                    generation.cancel()
+                
+                # If we get here, the model is loaded
+                st.session_state.model_loaded = True
+                
+                full_response = renderer.finish()
+                st.caption(context_caption(reply))
+                if sources:
+                    st.caption(sources_caption(sources))
+                if cached:
+                    reply["cached"] = True
+                    st.caption("💾 Replayed from the response cache")
+                elif done:
+                    if reply_cache_key:
+                        get_response_cache().put(reply_cache_key, st.session_state.model, full_response, done)
+                    # Split the reply's latency into queueing, loading, prefill, generation and drawing
+                    reply["metrics"] = generation.record(render_seconds=renderer.render_seconds)
+                    st.caption(metrics_caption(reply["metrics"]))
+                
+                # The status row is drawn after this, so it shows the model as loaded right away
+                if not model_loaded:
+                    get_status_cache().invalidate()
+                
+            except QueueFull as e:
+                st.warning(f"NeuralNexus is busy right now ({e}). Please try again in a moment.")
+                full_response = "Sorry, the server was too busy to answer. Please try again."
+                reply = {"role": "assistant"}
             
-            # Check if this is a model loading error and update state
-            if "failed to load model" in error_msg.lower():
-                st.session_state.model_loaded = False
-                st.info("Please try again - model will be reloaded")
+            except Exception as e:
+                error_msg = str(e)
+                st.error(f"Error: {error_msg}")
                 
-            full_response = "Sorry, I encountered an error. Please try again."
-        
-        # Add assistant response to chat history (only if we didn't already do it above)
-        if not st.session_state.get('just_loaded_model', False):
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+                # Check if this is a model loading error and update state
+                if "failed to load model" in error_msg.lower():
+                    st.session_state.model_loaded = False
+                    st.info("Please try again - model will be reloaded")
+                    
+                full_response = "Sorry, I encountered an error. Please try again."
+                reply = {"role": "assistant"}
+            
+            # Add assistant response to chat history
+            reply["content"] = full_response
+            add_message(reply)
 
 # Fixed clear chat button with custom formatting
 st.markdown('<div style="display: flex; justify-content: flex-start; margin-bottom: 1rem;">', unsafe_allow_html=True)
-if st.button("🗑️ Clear", key="clear_chat"):
-    st.session_state.messages = []
-    st.rerun()
-st.markdown('</div>', unsafe_allow_html=True) 
\ No newline at end of file
+st.button("🗑️ Clear", key="clear_chat", on_click=clear_conversation)
+st.markdown('</div>', unsafe_allow_html=True)
+
+timer.mark("chat")
+
+# Status sections render last so the chat area never waits on Ollama. Only
+# the status row redraws on a timer, and reruns the page once the others
+# are out of date
+st.session_state.status_drawn = status_signature()
+with model_status_slot:
+    show_sidebar_status()
+with memory_slot:
+    show_memory_controls()
+with memory_panel_slot:
+    show_memory_panel()
+with status_slot:
+    show_status_row()
+timer.mark("status")
+timer.report()
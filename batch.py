@@ -0,0 +1,274 @@
+"""Batch chat over JSONL prompts through the NeuralNexus core, from the command line or HTTP
+
+Each input line is a JSON object with a "prompt" (or a full "messages"
+list) and optionally an "id", a "system" prompt, a "model" to use instead
+of the -m models and per-prompt "options". Every prompt runs against every
+model; results are written as JSON lines in the order they finish, and
+aggregate throughput is reported at the end:
+
+    python batch.py prompts.jsonl -m llama2 -m mistral -o results.jsonl
+    python batch.py --serve --port 8600
+    curl --data-binary @prompts.jsonl 'localhost:8600/batch?model=llama2&concurrency=4'
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import BATCH_CONCURRENCY, GENERATION_QUEUE_TIMEOUT
+from core import NeuralNexus
+from metrics import MetricsRegistry
+from scheduler import QueueFull
+
+# Back-off between retries of a prompt the generation queue had no room for
+RETRY_DELAY = 0.1
+RETRY_MAX_DELAY = 5.0
+
+
+def read_prompts(lines):
+    """Prompt objects from JSONL lines, skipping blank ones"""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode()
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from None
+        if not isinstance(item, dict) or not (item.get("prompt") or item.get("messages")):
+            raise ValueError(f"line {number}: expected an object with a \"prompt\" or \"messages\"")
+        item.setdefault("id", number)
+        yield item
+
+
+def prompt_messages(item):
+    """Chat messages for one prompt object"""
+    messages = item.get("messages") or [{"role": "user", "content": item["prompt"]}]
+    if item.get("system"):
+        messages = [{"role": "system", "content": item["system"]}] + messages
+    return messages
+
+
+class BatchRun:
+    """Runs prompts against models with at most `concurrency` replies in flight.
+
+    Prompts are read lazily and only `concurrency` of them are pending at a
+    time, so inputs of any length run in bounded memory. Each worker thread
+    acts as its own session towards the core. A prompt the core's generation
+    queue turns away (because it is full, or the prompt waited too long) is
+    retried after a back-off, so a large batch slows down to what the
+    scheduler admits instead of failing; one still turned away after
+    `retry_timeout` seconds fails with the queue's error.
+    """
+
+    def __init__(self, core, models, concurrency=BATCH_CONCURRENCY, options=None,
+                 retry_timeout=GENERATION_QUEUE_TIMEOUT):
+        self.core = core
+        self.models = models
+        self.concurrency = max(1, concurrency)
+        self.options = options or {}
+        self.retry_timeout = retry_timeout
+        self._run_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._replies = self._failed = self._tokens = 0
+        # This run's replies only; the core's registry spans the whole process
+        self._metrics = MetricsRegistry(log_path="")
+
+    def _session_id(self):
+        session_id = f"batch-{self._run_id}-{threading.get_ident()}"
+        with self._lock:
+            self._sessions.add(session_id)
+        return session_id
+
+    def _run_one(self, item, model):
+        result = {"id": item["id"], "model": model}
+        if model is None:
+            result["error"] = "no model given for this prompt"
+            return result
+        try:
+            content, done = self._complete(model, item)
+            result.update(response=content, eval_count=done.get("eval_count"), metrics=done.get("metrics"))
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    def _complete(self, model, item):
+        delay = RETRY_DELAY
+        deadline = time.monotonic() + self.retry_timeout
+        while True:
+            try:
+                return self.core.complete(self._session_id(), model, prompt_messages(item),
+                                          {**self.options, **item.get("options", {})})
+            except QueueFull:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+                # Nothing was generated yet, so the prompt can simply be sent again
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def run(self, items, write):
+        """Run every prompt against its models, passing each result to `write`; returns the summary"""
+        started = time.monotonic()
+        slots = threading.BoundedSemaphore(self.concurrency)
+
+        def finished(future):
+            result = future.result()
+            try:
+                with self._lock:
+                    if "error" in result:
+                        self._failed += 1
+                    else:
+                        self._replies += 1
+                        self._tokens += result.get("eval_count") or 0
+                        if result.get("metrics"):
+                            self._metrics.record(result["model"], result["metrics"])
+                    write(result)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            for item, model in self._tasks(items):
+                slots.acquire()
+                executor.submit(self._run_one, item, model).add_done_callback(finished)
+        for session_id in self._sessions:
+            self.core.manager.release(session_id)
+        return self.summary(time.monotonic() - started)
+
+    def _tasks(self, items):
+        for item in items:
+            for model in ([item["model"]] if item.get("model") else self.models) or [None]:
+                yield item, model
+
+    def summary(self, seconds):
+        """Aggregate counts and throughput of the run"""
+        return {
+            "replies": self._replies,
+            "failed": self._failed,
+            "seconds": round(seconds, 3),
+            "replies_per_second": round(self._replies / seconds, 3) if seconds else 0.0,
+            "eval_tokens": self._tokens,
+            "tokens_per_second": round(self._tokens / seconds, 1) if seconds else 0.0,
+            "models": self._metrics.summary(),
+        }
+
+
+def format_summary(summary):
+    """Human-readable report of a run's summary"""
+    lines = [f"{summary['replies']} replies, {summary['failed']} failed in {summary['seconds']:.1f}s: "
+             f"{summary['replies_per_second']:.2f} replies/s, {summary['tokens_per_second']:.1f} tok/s overall"]
+    for row in summary["models"]:
+        lines.append(f"  {row['model']}: {row['replies']} replies, first token p50 {row['ttft_p50']:.2f}s "
+                     f"/ p95 {row['ttft_p95']:.2f}s, {row['tps_p50']:.1f} tok/s")
+    return "\n".join(lines)
+
+
+def _handler(core):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/models":
+                self._send_json({"models": core.installed_models()})
+            else:
+                self._send_json({"error": f"no route {self.path}"}, 404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/batch":
+                self._send_json({"error": f"no route {self.path}"}, 404)
+                return
+            query = parse_qs(url.query)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            try:
+                concurrency = int(query.get("concurrency", [BATCH_CONCURRENCY])[0])
+            except ValueError:
+                self._send_json({"error": "concurrency must be an integer"}, 400)
+                return
+            try:
+                items = list(read_prompts(body.splitlines()))
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+                return
+            run = BatchRun(core, query.get("model", []), concurrency)
+            # Results stream back as they finish; the summary is the last line
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+
+            def write(result):
+                self.wfile.write((json.dumps(result) + "\n").encode())
+                self.wfile.flush()
+            summary = run.run(items, write)
+            write({"summary": summary})
+
+    return Handler
+
+
+def serve(core, port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(core))
+    print(f"Batch API listening on http://127.0.0.1:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("prompts", nargs="?", help="JSONL file of prompts ('-' for stdin)")
+    parser.add_argument("-m", "--model", action="append", default=[], help="model to run every prompt on (repeatable)")
+    parser.add_argument("-o", "--output", help="JSONL file for results (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY, help="replies in flight at once")
+    parser.add_argument("--temperature", type=float, help="sampling temperature for every prompt")
+    parser.add_argument("--num-ctx", type=int, help="context window; longer histories are trimmed to fit")
+    parser.add_argument("--json", action="store_true", help="report the summary as JSON")
+    parser.add_argument("--serve", action="store_true", help="serve the batch HTTP API instead")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    core = NeuralNexus()
+    if args.serve:
+        serve(core, args.port)
+        return
+    if not args.prompts:
+        parser.error("give a prompts file, or --serve")
+    options = {key: value for key, value in (("temperature", args.temperature), ("num_ctx", args.num_ctx))
+               if value is not None}
+
+    source = sys.stdin if args.prompts == "-" else open(args.prompts)
+    output = open(args.output, "w") if args.output else sys.stdout
+    def write(result):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+    try:
+        summary = BatchRun(core, args.model, args.concurrency, options).run(read_prompts(source), write)
+    except ValueError as e:
+        sys.exit(f"error: {e}")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary), file=sys.stderr)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
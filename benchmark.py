@@ -0,0 +1,306 @@
+"""Offline performance benchmarks for NeuralNexus
+
+Drives the app's Ollama-facing code paths against an in-process stub
+server (stub_ollama.py), so it needs no Ollama install or network:
+
+    python benchmark.py                          # print a report
+    python benchmark.py --json                   # machine-readable report
+    python benchmark.py --max-calls-per-rerun 2  # exit 1 on a regression (for CI)
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from stub_ollama import StubOllama
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(APP_DIR, "app.py")
+
+# How long the status watcher's and idle unloader's background work is sampled for
+WATCHER_SAMPLE_SECONDS = 2.0
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[max(0, round(0.95 * len(ordered)) - 1)]
+
+
+def _timed(fn, repeats):
+    """Median milliseconds of `repeats` calls to `fn`"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return _ms(statistics.median(times))
+
+
+def _calls_during(stub, fn):
+    """Stub calls per endpoint made while `fn` runs"""
+    stub.reset_calls()
+    fn()
+    return stub.call_counts()
+
+
+def bench_client(stub, repeats):
+    """Model listing, status checks, preload/unload and chat streaming"""
+    from catalog import ModelCatalog
+    from model_status import StatusCache
+    from ollama_client import OllamaClient
+
+    client = OllamaClient(host=stub.url)
+    model = stub.models[0]
+    results = {}
+
+    results["list_ms"] = _timed(client.list, repeats)
+    catalog = ModelCatalog(client)
+    results["catalog_calls"] = _calls_during(stub, lambda: [catalog.names() for _ in range(repeats)])
+
+    results["ps_ms"] = _timed(client.ps, repeats)
+    status = StatusCache(client)
+    results["status_calls"] = _calls_during(stub, lambda: [status.is_loaded(model) for _ in range(repeats)])
+
+    results["preload_ms"] = _timed(lambda: client.preload(model), repeats)
+    results["unload_ms"] = _timed(lambda: client.unload(model), repeats)
+
+    first_tokens, rates = [], []
+    for _ in range(max(1, repeats // 5)):
+        started = time.perf_counter()
+        first = None
+        tokens = 0
+        for chunk in client.chat(model, [{"role": "user", "content": "hello"}], stream=True):
+            if chunk.get("message", {}).get("content"):
+                first = first or time.perf_counter()
+                tokens += 1
+        first_tokens.append(first - started)
+        rates.append(tokens / (time.perf_counter() - first) if tokens > 1 else 0.0)
+    results["chat_ttft_ms"] = _ms(statistics.median(first_tokens))
+    results["chat_tokens_per_second"] = round(statistics.median(rates), 1)
+    client.close()
+    return results
+
+
+class _NullContainer:
+    """Stands in for a Streamlit container and counts what would be drawn"""
+
+    def __init__(self):
+        self.draws = 0
+        self.bytes = 0
+
+    def container(self):
+        return self
+
+    def empty(self):
+        return self
+
+    def markdown(self, text):
+        self.draws += 1
+        self.bytes += len(text)
+
+
+def _sample_reply(tokens):
+    """Markdown resembling a real reply: prose, lists and a fenced code block"""
+    parts = []
+    for i in range(tokens):
+        if i % 200 == 60:
+            parts.append("\n\n```python\n")
+        elif i % 200 == 120:
+            parts.append("\n```\n\n")
+        elif i % 40 == 0:
+            parts.append("\n\n- ")
+        parts.append(f"word{i} ")
+    return parts
+
+
+def bench_render(tokens, tokens_per_second):
+    """CPU cost of StreamRenderer per streamed token, at a simulated token rate"""
+    from streaming import StreamRenderer
+
+    now = [0.0]
+    container = _NullContainer()
+    renderer = StreamRenderer(container, clock=lambda: now[0])
+    chunks = _sample_reply(tokens)
+    started = time.perf_counter()
+    for chunk in chunks:
+        now[0] += 1.0 / tokens_per_second
+        renderer.feed(chunk)
+    text = renderer.finish()
+    elapsed = time.perf_counter() - started
+    return {
+        "tokens": len(chunks),
+        "frames": renderer.frames,
+        "us_per_token": round(elapsed / len(chunks) * 1e6, 2),
+        "bytes_drawn_per_byte": round(container.bytes / len(text), 2),
+    }
+
+
+def _app():
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(APP_SCRIPT, default_timeout=60)
+
+
+def _background_work():
+    """Status watcher polls and idle-unloader checks so far, over every core in the process"""
+    from core import instances
+
+    cores = instances()
+    return sum(core.watcher.polls for core in cores), sum(core.idle.checks for core in cores)
+
+
+def bench_reruns(stub, reruns):
+    """Latency and Ollama calls of plain reruns with an idle chat.
+
+    The status watcher polls /api/ps and the idle unloader checks resident
+    models on their own timers, not per rerun, so their rates are sampled
+    separately and the watcher's polls are left out of the rerun counts.
+    """
+    at = _app()
+    started = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].message}")
+    at.run()
+
+    polls, checks = _background_work()
+    time.sleep(WATCHER_SAMPLE_SECONDS)
+    sampled_polls, sampled_checks = _background_work()
+
+    times = []
+    stub.reset_calls()
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - started)
+    calls = stub.call_counts()
+    # Each watcher poll is one /api/ps request made on the watcher's timer
+    watcher_calls = _background_work()[0] - sampled_polls
+    ps_calls = calls.pop("/api/ps", 0) - watcher_calls
+    if ps_calls > 0:
+        calls["/api/ps"] = ps_calls
+    return {
+        "first_run_ms": _ms(first_run),
+        "rerun_ms": _ms(statistics.median(times)),
+        "rerun_p95_ms": _ms(_p95(times)),
+        "calls_per_rerun": round(sum(calls.values()) / reruns, 2),
+        "calls": calls,
+        "watcher_polls_per_second": round((sampled_polls - polls) / WATCHER_SAMPLE_SECONDS, 2),
+        "idle_checks_per_second": round((sampled_checks - checks) / WATCHER_SAMPLE_SECONDS, 2),
+    }
+
+
+def bench_conversation(stub, turns):
+    """Per-turn latency and memory growth over a long conversation"""
+    at = _app()
+    at.run()
+    gc.collect()
+    tracemalloc.start()
+    memory, turn_times = [], []
+    try:
+        for turn in range(turns):
+            started = time.perf_counter()
+            at.chat_input[0].set_value(f"Question number {turn}: explain something at length").run()
+            turn_times.append(time.perf_counter() - started)
+            if at.exception:
+                raise RuntimeError(f"app raised: {at.exception[0].message}")
+            gc.collect()
+            memory.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+
+    # Skip the first few turns, which warm caches and imports
+    warm = max(1, turns // 5)
+    growth = (memory[-1] - memory[warm - 1]) / max(1, turns - warm)
+    started = time.perf_counter()
+    at.run()
+    return {
+        "turns": turns,
+        "first_turn_ms": _ms(turn_times[0]),
+        "last_turn_ms": _ms(turn_times[-1]),
+        "rerun_after_ms": _ms(time.perf_counter() - started),
+        "memory_growth_kib_per_turn": round(growth / 1024, 1),
+    }
+
+
+def run(args):
+    stub = StubOllama(tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+                      latency=args.latency).start()
+    data_dir = tempfile.TemporaryDirectory()
+    # Settings are read on import, so point them at the stub before loading any app module
+    os.environ["OLLAMA_HOST"] = stub.url
+    os.environ["NEURALNEXUS_DATA_DIR"] = data_dir.name
+    sys.path.insert(0, APP_DIR)
+    try:
+        report = {
+            "client": bench_client(stub, args.repeats),
+            "render": bench_render(args.render_tokens, args.tokens_per_second),
+            "reruns": bench_reruns(stub, args.reruns),
+            "conversation": bench_conversation(stub, args.turns),
+        }
+    finally:
+        stub.stop()
+        data_dir.cleanup()
+    return report
+
+
+def check_budgets(report, args):
+    """Budget violations in `report`, as messages"""
+    failures = []
+    reruns = report["reruns"]
+    if args.max_calls_per_rerun is not None and reruns["calls_per_rerun"] > args.max_calls_per_rerun:
+        failures.append(f"{reruns['calls_per_rerun']} Ollama calls per rerun "
+                        f"(budget {args.max_calls_per_rerun}): {reruns['calls']}")
+    if args.max_rerun_ms is not None and reruns["rerun_ms"] > args.max_rerun_ms:
+        failures.append(f"rerun took {reruns['rerun_ms']} ms (budget {args.max_rerun_ms} ms)")
+    growth = report["conversation"]["memory_growth_kib_per_turn"]
+    if args.max_memory_kib_per_turn is not None and growth > args.max_memory_kib_per_turn:
+        failures.append(f"memory grew {growth} KiB per turn (budget {args.max_memory_kib_per_turn} KiB)")
+    return failures
+
+
+def print_report(report):
+    for section, results in report.items():
+        print(f"[{section}]")
+        for name, value in results.items():
+            print(f"  {name:28} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline NeuralNexus performance benchmarks")
+    parser.add_argument("--repeats", type=int, default=20, help="iterations of each client call")
+    parser.add_argument("--reruns", type=int, default=20, help="idle reruns to time")
+    parser.add_argument("--turns", type=int, default=30, help="chat turns in the long conversation")
+    parser.add_argument("--render-tokens", type=int, default=2000, help="tokens streamed through the renderer")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="stub generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=100, help="tokens per stub reply")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub adds to every request")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-calls-per-rerun", type=float)
+    parser.add_argument("--max-rerun-ms", type=float)
+    parser.add_argument("--max-memory-kib-per-turn", type=float)
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    failures = check_budgets(report, args)
+    for failure in failures:
+        print(f"Budget exceeded: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
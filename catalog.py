@@ -0,0 +1,68 @@
+"""Memoized catalog of installed models and their metadata"""
+import threading
+import time
+
+from config import CATALOG_TTL
+from ollama_client import default_client
+
+# Fields of an /api/show response worth keeping; the modelfile, template
+# and parameters are large and the UI never displays them
+SHOW_FIELDS = ('modified_at', 'details')
+
+
+class ModelCatalog:
+    """Caches the model list for `ttl` seconds and /api/show per (name, digest).
+
+    The list is refreshed when the TTL expires or after `invalidate()` (called
+    when a pull completes or a model is deleted). Metadata entries are keyed
+    by digest, so they survive list refreshes until the model actually changes.
+    """
+
+    def __init__(self, client=None, ttl=CATALOG_TTL):
+        self._client = client or default_client()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._models = None
+        self._fetched_at = 0.0
+        self._info = {}
+
+    def models(self):
+        """Return installed model entries keyed by name, refreshing if stale"""
+        with self._lock:
+            if self._models is None or time.monotonic() - self._fetched_at >= self.ttl:
+                response = self._client.list()
+                self._models = {model['name']: model for model in response.get('models', [])}
+                self._fetched_at = time.monotonic()
+                # Forget metadata for models that were removed or re-pulled
+                current = {(name, model.get('digest')) for name, model in self._models.items()}
+                self._info = {key: info for key, info in self._info.items() if key in current}
+            return self._models
+
+    def names(self):
+        """Return the names of the installed models"""
+        return list(self.models())
+
+    def info(self, model_name):
+        """Return trimmed metadata (size, modified_at, details) for a model"""
+        entry = self.models().get(model_name)
+        if entry is None:
+            return None
+        key = (model_name, entry.get('digest'))
+        with self._lock:
+            info = self._info.get(key)
+        if info is None:
+            response = self._client.show(model_name)
+            info = {field: response[field] for field in SHOW_FIELDS if field in response}
+            info.setdefault('modified_at', entry.get('modified_at'))
+            info['size'] = entry.get('size', 0)
+            info['digest'] = entry.get('digest')
+            with self._lock:
+                self._info[key] = info
+        return info
+
+    def invalidate(self, model_name=None):
+        """Force a list refresh, and drop cached metadata for `model_name` if given"""
+        with self._lock:
+            self._models = None
+            if model_name is not None:
+                self._info = {key: info for key, info in self._info.items() if key[0] != model_name}
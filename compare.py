@@ -0,0 +1,39 @@
+"""Planning side-by-side comparisons of several models"""
+
+# Most models one prompt can be compared across
+MAX_COMPARE_MODELS = 4
+
+
+def comparison_budget(resident, sizes, budget=None):
+    """Bytes of models that may be loaded at the same time.
+
+    Uses the residency budget when there is one. Otherwise trusts what
+    /api/ps shows: models resident together right now evidently fit, and
+    any single model fits on its own.
+    """
+    if budget:
+        return budget
+    return max(sum(resident.values()), max(sizes.values(), default=0))
+
+
+def plan_batches(models, sizes, resident, budget):
+    """Split `models` into rounds whose models fit in `budget` together.
+
+    `sizes` maps each model to its memory footprint and `resident` the
+    models /api/ps reports loaded to theirs. Resident models go first, so
+    a round never evicts a model it is about to use; each round holds at
+    least one model even if it alone exceeds the budget.
+    """
+    ordered = sorted(models, key=lambda model: model not in resident)
+    batches = []
+    batch, used = [], 0
+    for model in ordered:
+        size = resident.get(model) or sizes.get(model, 0)
+        if batch and used + size > budget:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(model)
+        used += size
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,137 @@
+"""Runtime settings for NeuralNexus, read from the environment or a .env file"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_float(name, default):
+    """Read a float setting, falling back to the default if unset or invalid"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _normalize_host(host):
+    """Turn OLLAMA_HOST values like '0.0.0.0:11434' into a base URL"""
+    host = host.strip().rstrip('/')
+    if '://' not in host:
+        host = f"http://{host}"
+    return host
+
+
+# Base URL of the Ollama server (same variable the Ollama CLI uses)
+OLLAMA_HOST = _normalize_host(os.environ.get("OLLAMA_HOST", "http://localhost:11434"))
+
+# Seconds a /api/ps snapshot is shared before anyone polls Ollama again
+STATUS_TTL = _env_float("NEURALNEXUS_STATUS_TTL", 2.0)
+
+# Seconds the installed model list is reused before asking Ollama again
+CATALOG_TTL = _env_float("NEURALNEXUS_CATALOG_TTL", 300.0)
+
+# Ollama transport: request/connect timeouts (seconds), connection retries
+# and the size of the keep-alive connection pool
+OLLAMA_TIMEOUT = _env_float("NEURALNEXUS_OLLAMA_TIMEOUT", 30.0)
+OLLAMA_CONNECT_TIMEOUT = _env_float("NEURALNEXUS_OLLAMA_CONNECT_TIMEOUT", 5.0)
+OLLAMA_RETRIES = int(_env_float("NEURALNEXUS_OLLAMA_RETRIES", 2))
+OLLAMA_MAX_CONNECTIONS = int(_env_float("NEURALNEXUS_OLLAMA_MAX_CONNECTIONS", 20))
+
+# Streaming output: redraws per second, and how much unrendered text (in
+# characters) may pile up before a redraw happens early
+STREAM_FPS = _env_float("NEURALNEXUS_STREAM_FPS", 15.0)
+STREAM_MAX_PENDING_BYTES = int(_env_float("NEURALNEXUS_STREAM_MAX_PENDING_BYTES", 4096))
+
+# History budgeting: characters per token for estimates, and tokens of the
+# context window kept free for the reply
+CHARS_PER_TOKEN = int(_env_float("NEURALNEXUS_CHARS_PER_TOKEN", 4))
+REPLY_RESERVE_TOKENS = int(_env_float("NEURALNEXUS_REPLY_RESERVE_TOKENS", 1024))
+
+# keep_alive policy (seconds): fallback when a model has no usage history,
+# bounds for the computed value, and how many seconds of residency each
+# second of cold-load time buys
+KEEP_ALIVE_DEFAULT = _env_float("NEURALNEXUS_KEEP_ALIVE_DEFAULT", 300.0)
+KEEP_ALIVE_MIN = _env_float("NEURALNEXUS_KEEP_ALIVE_MIN", 60.0)
+KEEP_ALIVE_MAX = _env_float("NEURALNEXUS_KEEP_ALIVE_MAX", 3600.0)
+KEEP_ALIVE_LOAD_FACTOR = _env_float("NEURALNEXUS_KEEP_ALIVE_LOAD_FACTOR", 30.0)
+
+# Background model jobs: worker threads, and how long to wait for /api/ps to
+# confirm a load or unload before reporting failure
+JOB_WORKERS = int(_env_float("NEURALNEXUS_JOB_WORKERS", 4))
+JOB_CONFIRM_TIMEOUT = _env_float("NEURALNEXUS_JOB_CONFIRM_TIMEOUT", 120.0)
+
+# Where NeuralNexus keeps its own state (download queue, etc.)
+DATA_DIR = os.path.expanduser(os.environ.get("NEURALNEXUS_DATA_DIR", "~/.neuralnexus"))
+
+# How many model pulls may run at the same time
+DOWNLOAD_CONCURRENCY = int(_env_float("NEURALNEXUS_DOWNLOAD_CONCURRENCY", 2))
+
+# Chat history: messages loaded from the conversation store when a
+# conversation is opened, and how many of them are rendered up front
+HISTORY_LOAD_LIMIT = int(_env_float("NEURALNEXUS_HISTORY_LOAD_LIMIT", 200))
+HISTORY_RENDER_WINDOW = int(_env_float("NEURALNEXUS_HISTORY_RENDER_WINDOW", 20))
+
+# Desktop launcher: seconds to wait for Streamlit to report healthy
+STARTUP_TIMEOUT = _env_float("NEURALNEXUS_STARTUP_TIMEOUT", 60.0)
+
+# Log per-phase timings of every script run
+PROFILE = os.environ.get("NEURALNEXUS_PROFILE", "").lower() in ("1", "true", "yes")
+
+# Multi-user coordination: how often the shared status watcher diffs model
+# status for load, unload and expiry events, and how long a browser session
+# counts as using its model after its last interaction
+STATUS_POLL_INTERVAL = _env_float("NEURALNEXUS_STATUS_POLL_INTERVAL", 1.0)
+SESSION_TIMEOUT = _env_float("NEURALNEXUS_SESSION_TIMEOUT", 900.0)
+
+# Resident models are unloaded once no session has been active with them
+# for this many seconds (0 turns idle unloading off)
+IDLE_UNLOAD_TIMEOUT = _env_float("NEURALNEXUS_IDLE_UNLOAD_TIMEOUT", 1800.0)
+
+# How often the status indicators, memory panel and download progress
+# redraw themselves (without rerunning the rest of the page)
+STATUS_REFRESH_INTERVAL = _env_float("NEURALNEXUS_STATUS_REFRESH_INTERVAL", 1.0)
+
+# Generation scheduling: concurrent chat requests overall and per model
+# (Ollama's own OLLAMA_NUM_PARALLEL), how many may wait, and for how long
+GENERATION_WORKERS = int(_env_float("NEURALNEXUS_GENERATION_WORKERS", 8))
+OLLAMA_NUM_PARALLEL = int(_env_float("OLLAMA_NUM_PARALLEL", 1))
+GENERATION_QUEUE_LIMIT = int(_env_float("NEURALNEXUS_GENERATION_QUEUE_LIMIT", 32))
+GENERATION_QUEUE_TIMEOUT = _env_float("NEURALNEXUS_GENERATION_QUEUE_TIMEOUT", 300.0)
+
+# Reply metrics: replies kept per model for the performance summary, and an
+# optional JSONL file every reply's metrics are appended to
+METRICS_WINDOW = int(_env_float("NEURALNEXUS_METRICS_WINDOW", 500))
+METRICS_LOG = os.environ.get("NEURALNEXUS_METRICS_LOG", "")
+
+# Memory resident models may occupy together, in GB; 0 uses most of this
+# machine's RAM when Ollama runs locally and no limit for a remote host.
+# When a model would not fit, resident ones are unloaded first, least
+# recently used ("lru") or cheapest to reload relative to idle time ("cost")
+MEMORY_BUDGET_GB = _env_float("NEURALNEXUS_MEMORY_BUDGET_GB", 0.0)
+EVICTION_POLICY = os.environ.get("NEURALNEXUS_EVICTION_POLICY", "lru").lower()
+
+# Prewarming: preload the model a user picks, or on a new session the one
+# they most likely want at this time of day if its share of their requests
+# around this hour reaches PREWARM_MIN_SCORE
+PREWARM_ENABLED = os.environ.get("NEURALNEXUS_PREWARM", "1").lower() not in ("0", "false", "no")
+PREWARM_MIN_SCORE = _env_float("NEURALNEXUS_PREWARM_MIN_SCORE", 0.3)
+
+# Response cache: replay stored replies to identical prompts at temperature
+# 0 (the sidebar toggle's default), kept within this many MB on disk
+RESPONSE_CACHE = os.environ.get("NEURALNEXUS_RESPONSE_CACHE", "").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_MB = _env_float("NEURALNEXUS_RESPONSE_CACHE_MAX_MB", 100.0)
+
+# Document retrieval: the Ollama model that embeds documents and prompts,
+# chunk size and overlap in characters, how many chunks a prompt gets and
+# how similar (cosine) they must be, and ingestion parallelism
+EMBED_MODEL = os.environ.get("NEURALNEXUS_EMBED_MODEL", "nomic-embed-text")
+CHUNK_CHARS = int(_env_float("NEURALNEXUS_CHUNK_CHARS", 1200))
+CHUNK_OVERLAP = int(_env_float("NEURALNEXUS_CHUNK_OVERLAP", 200))
+RETRIEVAL_TOP_K = int(_env_float("NEURALNEXUS_RETRIEVAL_TOP_K", 4))
+RETRIEVAL_MIN_SCORE = _env_float("NEURALNEXUS_RETRIEVAL_MIN_SCORE", 0.3)
+INGEST_WORKERS = int(_env_float("NEURALNEXUS_INGEST_WORKERS", 4))
+EMBED_BATCH = int(_env_float("NEURALNEXUS_EMBED_BATCH", 32))
+
+# Batch runs (batch.py): replies in flight at once
+BATCH_CONCURRENCY = int(_env_float("NEURALNEXUS_BATCH_CONCURRENCY", 4))
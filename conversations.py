@@ -0,0 +1,137 @@
+"""On-disk store for named chat conversations (SQLite, WAL mode)"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_by_owner ON conversations (owner, updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    meta TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, id);
+"""
+
+# Restricts a query by conversation_id to conversations of one owner
+OWNED = "conversation_id IN (SELECT id FROM conversations WHERE id = ? AND owner = ?)"
+
+# Message keys stored in their own columns; anything else goes into `meta`
+COLUMNS = ("id", "role", "content")
+
+
+def _row_to_message(row):
+    message = json.loads(row[3]) if row[3] else {}
+    message.update(id=row[0], role=row[1], content=row[2])
+    return message
+
+
+class ConversationStore:
+    """Named conversations and their messages, kept apart per owner.
+
+    Every conversation belongs to one owner (the user it was created by),
+    and each method only sees conversations of the owner it is given.
+    Messages are plain dicts like the ones in st.session_state.messages;
+    extra keys (token counts, metrics) round-trip through a JSON column.
+    Reads are paginated by message id so callers can load a conversation
+    from the newest message backwards.
+    """
+
+    def __init__(self, path=os.path.join(DATA_DIR, "conversations.db")):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def create(self, name, owner):
+        """Create a conversation for `owner` and return its id"""
+        now = time.time()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO conversations (owner, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (owner, name, now, now))
+            return cursor.lastrowid
+
+    def conversations(self, owner):
+        """Conversations of `owner` as (id, name) pairs, most recently used first"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, name FROM conversations WHERE owner = ? ORDER BY updated_at DESC, id DESC",
+                (owner,)).fetchall()
+
+    def name(self, conversation_id, owner):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name FROM conversations WHERE id = ? AND owner = ?",
+                (conversation_id, owner)).fetchone()
+        return row[0] if row else None
+
+    def rename(self, conversation_id, name, owner):
+        with self._lock, self._db:
+            self._db.execute("UPDATE conversations SET name = ? WHERE id = ? AND owner = ?",
+                             (name, conversation_id, owner))
+
+    def delete(self, conversation_id, owner):
+        """Delete a conversation and all of its messages"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM conversations WHERE id = ? AND owner = ?", (conversation_id, owner))
+
+    def clear(self, conversation_id, owner):
+        """Delete every message in a conversation but keep the conversation"""
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM messages WHERE {OWNED}", (conversation_id, owner))
+
+    def append(self, conversation_id, message, owner):
+        """Store a message and set its "id" key to the new row id"""
+        meta = {key: value for key, value in message.items() if key not in COLUMNS}
+        now = time.time()
+        with self._lock, self._db:
+            updated = self._db.execute("UPDATE conversations SET updated_at = ? WHERE id = ? AND owner = ?",
+                                       (now, conversation_id, owner))
+            if not updated.rowcount:
+                raise KeyError(f"no conversation {conversation_id} for {owner}")
+            cursor = self._db.execute(
+                "INSERT INTO messages (conversation_id, role, content, meta, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, message["role"], message["content"],
+                 json.dumps(meta) if meta else None, now))
+        message["id"] = cursor.lastrowid
+        return message["id"]
+
+    def count(self, conversation_id, owner):
+        """Number of messages in a conversation"""
+        with self._lock:
+            return self._db.execute(
+                f"SELECT COUNT(*) FROM messages WHERE {OWNED}",
+                (conversation_id, owner)).fetchone()[0]
+
+    def recent(self, conversation_id, limit, owner, before_id=None):
+        """Up to `limit` messages older than `before_id` (or the newest), oldest first"""
+        query = f"SELECT id, role, content, meta FROM messages WHERE {OWNED}"
+        params = [conversation_id, owner]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [_row_to_message(row) for row in reversed(rows)]
@@ -0,0 +1,241 @@
+"""Importable NeuralNexus core: the app's Ollama plumbing without the Streamlit UI"""
+import threading
+import time
+import weakref
+from contextlib import ExitStack
+
+from catalog import ModelCatalog
+from downloads import DownloadManager
+from history import fit_history
+from idle import IdleUnloader
+from jobs import ModelJobs
+from lifecycle import LifecyclePolicy, split_options
+from metrics import MetricsRegistry, reply_metrics
+from model_manager import ModelManager
+from model_status import UNLOADED, StatusCache, StatusWatcher
+from ollama_client import default_client
+from residency import ResidencyManager
+from scheduler import GenerationScheduler
+
+# Every NeuralNexus created in this process, for tools that report on all of them
+_INSTANCES = weakref.WeakSet()
+
+
+def instances():
+    """NeuralNexus objects alive in this process"""
+    return list(_INSTANCES)
+
+
+class ChatStream:
+    """A reply being generated: its scheduled Generation and the bookkeeping around it.
+
+    Until it is cancelled the session counts as generating from the model,
+    so no other caller unloads it. Read it by iterating, or with drain() to
+    interleave several streams in one thread. The final chunk is kept as
+    `done`, and record() feeds it to the lifecycle policy and metrics.
+    """
+
+    def __init__(self, core, model, generation, load_options, evicted, release):
+        self.model = model
+        self.generation = generation
+        # Models unloaded to make room for this one
+        self.evicted = evicted
+        self.first_token_at = None
+        self.done = None
+        self.metrics = None
+        self._core = core
+        self._load_options = load_options
+        self._release = release
+
+    @property
+    def queued(self):
+        return self.generation.queued
+
+    @property
+    def position(self):
+        return self.generation.position
+
+    def wait_started(self, timeout=None):
+        """Block until the request leaves the queue; False on timeout"""
+        return self.generation.wait_started(timeout)
+
+    def drain(self):
+        """Chunks received since the last call and whether the reply finished, without blocking"""
+        chunks, finished = self.generation.drain()
+        for chunk in chunks:
+            self._note(chunk)
+        return chunks, finished
+
+    def __iter__(self):
+        for chunk in self.generation:
+            self._note(chunk)
+            yield chunk
+
+    def _note(self, chunk):
+        if self.first_token_at is None and chunk.get("message", {}).get("content"):
+            self.first_token_at = time.monotonic()
+        if chunk.get("done"):
+            self.done = chunk
+
+    def record(self, render_seconds=0.0):
+        """Metrics of the finished reply, recorded once; None if it didn't finish"""
+        if self.done is not None and self.metrics is None:
+            self.metrics = self._core.record_reply(self.model, self.generation, self.done, self._load_options,
+                                                   self.first_token_at, render_seconds)
+        return self.metrics
+
+    def cancel(self):
+        """Stop the request if it is still running and stop counting it as generating"""
+        self.generation.cancel()
+        self._release()
+
+
+class NeuralNexus:
+    """Model management and scheduled chat, shared by every caller in a process.
+
+    The Streamlit app keeps one instance for all browser sessions; scripts
+    and the batch runner create their own. Callers identify themselves with
+    a session ID, as browser sessions do, so models in use by one caller
+    are never unloaded or reconfigured by another.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or default_client()
+        self.catalog = ModelCatalog(self.client)
+        self.status = StatusCache(self.client)
+        self.policy = LifecyclePolicy()
+        self.manager = ModelManager(self.status, self.policy)
+        self.watcher = StatusWatcher(self.status, active=self.manager.active)
+        self.watcher.subscribe(self._on_status_event)
+        self.jobs = ModelJobs(self.status, self.client, on_loaded=self.policy.note_loaded,
+                              on_unloaded=self.policy.forget)
+        self.idle = IdleUnloader(self.status, self.manager, self.jobs)
+        self.residency = ResidencyManager(self.status, self.catalog, self.policy, self.manager, self.jobs,
+                                          idle=self.idle)
+        self.scheduler = GenerationScheduler(self.client)
+        self.metrics = MetricsRegistry()
+        self._downloads = None
+        self._lock = threading.Lock()
+        _INSTANCES.add(self)
+
+    @property
+    def downloads(self):
+        """Download manager, created on first use since it resumes unfinished pulls"""
+        with self._lock:
+            if self._downloads is None:
+                self._downloads = DownloadManager(self.client, on_complete=self._on_download_complete)
+            return self._downloads
+
+    def _on_download_complete(self, model):
+        self.catalog.invalidate(model)
+        self.status.invalidate()
+
+    def _on_status_event(self, event):
+        # Models Ollama expired on its own lose their load options too
+        if event.kind == UNLOADED:
+            self.policy.forget(event.model)
+
+    def installed_models(self):
+        """Names of the models Ollama has on disk"""
+        return self.catalog.names()
+
+    def is_loaded(self, model):
+        """Whether Ollama has `model` in memory, from the shared status snapshot"""
+        return self.status.is_loaded(model)
+
+    def unload(self, session_id, model):
+        """Start unloading a model in the background.
+
+        Returns (started, reason): a model that isn't loaded counts as done,
+        and one another session is using is left alone with the reason why.
+        """
+        if not self.is_loaded(model):
+            return True, None
+        allowed, reason = self.manager.can_unload(session_id, model)
+        if not allowed:
+            return False, reason
+        # Ollama evicts the model when asked with keep_alive=0; the job confirms it via /api/ps
+        self.jobs.unload(model)
+        return True, None
+
+    def download(self, model):
+        """Start pulling a model in the background; returns its Download"""
+        return self.downloads.pull(model)
+
+    def make_room(self, session_id, models):
+        """Unload idle models so `models` fit in the memory budget; returns what was unloaded"""
+        try:
+            return self.residency.make_room(session_id, models)
+        except Exception:
+            # Loading anyway is no worse than before the budget existed
+            return []
+
+    def load(self, session_id, model, options=None):
+        """Start loading a model in the background, making room for it first; returns its ModelJob"""
+        return self.jobs.load(model, options=options, keep_alive=self.policy.keep_alive(model),
+                              before=lambda: self.make_room(session_id, [model]))
+
+    def submit(self, session_id, model, messages, options=None):
+        """Queue a streaming chat request with the model's keep_alive; returns its Generation"""
+        return self.scheduler.submit(session_id, model, messages, options=options,
+                                     keep_alive=self.policy.keep_alive(model))
+
+    def record_reply(self, model, generation, done, load_options, first_token_at=None, render_seconds=0.0):
+        """Feed a finished reply to the lifecycle policy and metrics; returns its metrics"""
+        self.policy.record_request(model, load_options, done.get("load_duration"))
+        submitted = generation.submitted_at
+        metrics = reply_metrics(
+            done,
+            queue_seconds=generation.started_at - submitted,
+            ttft_seconds=first_token_at - submitted if first_token_at else None,
+            total_seconds=time.monotonic() - submitted,
+            render_seconds=render_seconds,
+        )
+        self.metrics.record(model, metrics)
+        return metrics
+
+    def start_chat(self, session_id, model, messages, options=None):
+        """Queue a reply to `messages` and return its ChatStream.
+
+        History is trimmed to the context window, and room is made for the
+        model if it isn't loaded. Raises QueueFull when the scheduler has no
+        room; the stream must be cancelled once it has been read.
+        """
+        options = dict(options or {})
+        load_options, _ = split_options(options)
+        if "num_ctx" in load_options:
+            messages, _, _ = fit_history(messages, load_options["num_ctx"])
+        evicted = [] if self.is_loaded(model) else self.make_room(session_id, [model])
+        stack = ExitStack()
+        stack.enter_context(self.manager.generating(session_id, model))
+        try:
+            generation = self.submit(session_id, model, messages, options or None)
+        except BaseException:
+            stack.close()
+            raise
+        return ChatStream(self, model, generation, load_options, evicted, stack.close)
+
+    def chat(self, session_id, model, messages, options=None):
+        """Stream a reply to `messages`, yielding Ollama's chunks as they arrive.
+
+        The request goes through start_chat() and waits its turn in the
+        scheduler. The final chunk also carries the reply's "metrics".
+        """
+        stream = self.start_chat(session_id, model, messages, options)
+        try:
+            for chunk in stream:
+                if chunk.get("done"):
+                    chunk = {**chunk, "metrics": stream.record()}
+                yield chunk
+        finally:
+            # Stops the stream if the caller stops reading mid-reply
+            stream.cancel()
+
+    def complete(self, session_id, model, messages, options=None):
+        """The whole reply to `messages` and the final chunk it ended with"""
+        content, done = [], {}
+        for chunk in self.chat(session_id, model, messages, options):
+            content.append(chunk.get("message", {}).get("content") or "")
+            if chunk.get("done"):
+                done = chunk
+        return "".join(content), done
@@ -0,0 +1,396 @@
+"""Local document index for retrieval-augmented chat (memory-mapped NumPy vectors, SQLite catalog)"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import (CHUNK_CHARS, CHUNK_OVERLAP, DATA_DIR, EMBED_BATCH, EMBED_MODEL,
+                    INGEST_WORKERS, RETRIEVAL_MIN_SCORE, RETRIEVAL_TOP_K)
+from ollama_client import default_client
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    chunks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    live INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS chunks_by_path ON chunks (path);
+"""
+
+# Files worth indexing; anything else in a folder is skipped
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".org", ".tex", ".csv", ".json", ".yaml", ".yml",
+    ".toml", ".ini", ".cfg", ".html", ".css", ".py", ".js", ".ts", ".java", ".go", ".rs",
+    ".c", ".h", ".cpp", ".hpp", ".sh", ".sql",
+}
+
+READ_BLOCK = 64 * 1024
+
+# The vector file grows by at least this many rows at a time
+MIN_GROWTH = 1024
+
+# Dead rows (from changed or removed files) are compacted away past this share
+COMPACT_SHARE = 0.5
+
+
+def _break_point(text, size):
+    # Prefer ending a chunk on a paragraph, line, sentence or word break in its second half
+    for separator in ("\n\n", "\n", ". ", " "):
+        cut = text.rfind(separator, size // 2, size)
+        if cut != -1:
+            return cut + len(separator)
+    return size
+
+
+def iter_chunks(f, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Yield the text chunks of an open text file, reading it a block at a time.
+
+    Chunks are at most `size` characters, end on a natural break where
+    possible, and each repeats the last `overlap` characters of the one
+    before so a passage split between them is still found whole.
+    """
+    overlap = min(overlap, size // 2 - 1)
+    buffer = ""
+    eof = False
+    while True:
+        while not eof and len(buffer) < size:
+            block = f.read(READ_BLOCK)
+            eof = not block
+            buffer += block
+        if len(buffer) <= size:
+            if buffer.strip():
+                yield buffer.strip()
+            return
+        cut = _break_point(buffer, size)
+        if buffer[:cut].strip():
+            yield buffer[:cut].strip()
+        # Start the overlap on a word boundary
+        start = max(cut - overlap, 1)
+        space = buffer.find(" ", start, cut)
+        buffer = buffer[space + 1 if space != -1 else start:]
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_documents(root):
+    """Indexable files at `root`: the file itself, or the text files below a folder"""
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+        for name in files:
+            if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS:
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+
+def documents_message(results):
+    """System message handing retrieved excerpts to the model"""
+    excerpts = "\n\n".join(f"[{number}] {os.path.basename(result['path'])}\n{result['text']}"
+                           for number, result in enumerate(results, start=1))
+    return {"role": "system",
+            "content": "Use these excerpts from the user's documents when they help answer, "
+                       "and cite them by number.\n\n" + excerpts}
+
+
+class IngestJob:
+    """Progress of one indexing run, readable from any session"""
+
+    def __init__(self, root):
+        self.root = root
+        self.state = "running"
+        self.error = None
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0
+        self.chunks_added = 0
+        self.failures = {}
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def fraction(self):
+        return self.files_done / self.files_total if self.files_total else 0.0
+
+
+class DocumentIndex:
+    """Chunks of the user's documents and their embeddings, searchable by similarity.
+
+    Vectors are unit length and stored as rows of a float32 file that is
+    memory-mapped, so the index is neither loaded into RAM up front nor
+    copied for a search. The SQLite catalog maps each row to its chunk text
+    and file. Indexing runs in the background and only re-embeds files
+    whose size, modification time and contents changed; several files are
+    chunked and embedded at once, each in batches of `batch` chunks. The
+    rows of a changed or deleted file are only marked dead, and the vector
+    file is compacted once most of it is dead.
+    """
+
+    def __init__(self, directory=os.path.join(DATA_DIR, "documents"), client=None,
+                 embed_model=EMBED_MODEL, workers=INGEST_WORKERS, batch=EMBED_BATCH):
+        os.makedirs(directory, exist_ok=True)
+        self.embed_model = embed_model
+        self._client = client or default_client()
+        self._batch = batch
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self.job = None
+        self._open()
+
+    # -- vector storage --------------------------------------------------
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _open(self):
+        with self._lock:
+            dim = self._meta("dim")
+            self._dim = int(dim) if dim else None
+            self._rows = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+            self._vectors = None
+            self._live = np.zeros(self._rows, dtype=bool)
+            live = [row for (row,) in self._db.execute("SELECT row FROM chunks WHERE live = 1")]
+            self._live[live] = True
+            if self._dim and self._rows and os.path.exists(self._vectors_path):
+                self._map()
+
+    def _capacity(self):
+        if not self._dim or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self._dim * 4)
+
+    def _map(self):
+        capacity = self._capacity()
+        self._vectors = (np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                   shape=(capacity, self._dim)) if capacity else None)
+
+    def _append(self, vectors):
+        # Caller holds the lock; returns the first row written
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self._dim),))
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"{self.embed_model} returned {vectors.shape[1]}-dimensional vectors, "
+                             f"the index holds {self._dim}")
+        start = self._rows
+        needed = start + len(vectors)
+        if needed > self._capacity():
+            self._vectors = None
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(max(MIN_GROWTH, 2 * needed) * self._dim * 4)
+            self._map()
+        self._vectors[start:needed] = vectors
+        self._vectors.flush()
+        self._rows = needed
+        self._live = np.concatenate([self._live, np.ones(len(vectors), dtype=bool)])
+        return start
+
+    def _remove(self, path):
+        # Caller holds the lock and a transaction
+        rows = [row for (row,) in self._db.execute("SELECT row FROM chunks WHERE path = ? AND live = 1", (path,))]
+        self._db.execute("UPDATE chunks SET live = 0 WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._live[rows] = False
+
+    def _compact(self):
+        # Caller holds the lock
+        if not self._rows or self._live.sum() > self._rows * (1 - COMPACT_SHARE):
+            return
+        keep = np.flatnonzero(self._live)
+        vectors = np.array(self._vectors[keep]) if len(keep) else np.zeros((0, self._dim), np.float32)
+        self._vectors = None
+        with self._db:
+            self._db.execute("DELETE FROM chunks WHERE live = 0")
+            # Rows only move down, so renumbering in order never collides
+            self._db.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                                 [(new, int(old)) for new, old in enumerate(keep)])
+        with open(self._vectors_path, "wb") as f:
+            f.truncate(max(MIN_GROWTH, 2 * len(keep)) * self._dim * 4)
+        self._map()
+        self._vectors[:len(keep)] = vectors
+        self._vectors.flush()
+        self._rows = len(keep)
+        self._live = np.ones(len(keep), dtype=bool)
+
+    # -- embedding and search --------------------------------------------
+
+    def embed(self, texts):
+        """Unit-length embeddings of `texts`, one row each"""
+        vectors = np.asarray(self._client.embed(self.embed_model, texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def search(self, query, k=RETRIEVAL_TOP_K, min_score=RETRIEVAL_MIN_SCORE):
+        """The `k` chunks most similar to `query` scoring at least `min_score`, best first"""
+        if not self.chunk_count():
+            return []
+        query_vector = self.embed([query])[0]
+        with self._lock:
+            if self._vectors is None or query_vector.shape[0] != self._dim:
+                return []
+            scores = self._vectors[:self._rows] @ query_vector
+            scores[~self._live] = -np.inf
+            k = min(k, int(self._live.sum()))
+            if not k:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for row in top:
+                if scores[row] < min_score:
+                    break
+                path, text = self._db.execute("SELECT path, text FROM chunks WHERE row = ?",
+                                              (int(row),)).fetchone()
+                results.append({"path": path, "text": text, "score": float(scores[row])})
+        return results
+
+    # -- ingestion -------------------------------------------------------
+
+    def ingest(self, root):
+        """Start indexing a file or folder in the background; returns its IngestJob"""
+        with self._lock:
+            if self.job and self.job.running:
+                return self.job
+            self.job = IngestJob(os.path.abspath(os.path.expanduser(root)))
+        threading.Thread(target=self._ingest, args=(self.job,), name="ingest", daemon=True).start()
+        return self.job
+
+    def _ingest(self, job):
+        try:
+            if not os.path.exists(job.root):
+                raise FileNotFoundError(f"{job.root} does not exist")
+            if self._meta("embed_model") not in (None, self.embed_model):
+                # Vectors from different models aren't comparable
+                self.clear()
+            with self._lock, self._db:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('embed_model', ?)",
+                                 (self.embed_model,))
+            paths = find_documents(job.root)
+            job.files_total = len(paths)
+            self._forget_missing(job.root, set(paths))
+            for path, future in [(path, self._executor.submit(self._ingest_file, path, job)) for path in paths]:
+                try:
+                    future.result()
+                except Exception as e:
+                    job.failures[path] = str(e)
+                job.files_done += 1
+            with self._lock:
+                self._compact()
+            job.state = "failed" if paths and len(job.failures) == len(paths) else "done"
+            if job.state == "failed":
+                job.error = next(iter(job.failures.values()))
+        except Exception as e:
+            job.error = str(e)
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_missing(self, root, present):
+        # Files indexed from under `root` earlier that are gone now
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock, self._db:
+            for (path,) in self._db.execute("SELECT path FROM files").fetchall():
+                if (path == root or path.startswith(prefix)) and path not in present:
+                    self._remove(path)
+
+    def _ingest_file(self, path, job):
+        stat = os.stat(path)
+        with self._lock:
+            known = self._db.execute("SELECT mtime, size, digest FROM files WHERE path = ?", (path,)).fetchone()
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size:
+            job.files_skipped += 1
+            return
+        digest = file_digest(path)
+        if known and known[2] == digest:
+            # Touched but not changed
+            with self._lock, self._db:
+                self._db.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?",
+                                 (stat.st_mtime, stat.st_size, path))
+            job.files_skipped += 1
+            return
+        texts, batches = [], []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            batch = []
+            for chunk in iter_chunks(f):
+                batch.append(chunk)
+                if len(batch) == self._batch:
+                    batches.append(self.embed(batch))
+                    texts.extend(batch)
+                    batch = []
+            if batch:
+                batches.append(self.embed(batch))
+                texts.extend(batch)
+        with self._lock, self._db:
+            # The old chunks stay searchable until the new ones are ready
+            self._remove(path)
+            if texts:
+                start = self._append(np.concatenate(batches))
+                self._db.executemany("INSERT INTO chunks (row, path, ordinal, text) VALUES (?, ?, ?, ?)",
+                                     [(start + ordinal, path, ordinal, text) for ordinal, text in enumerate(texts)])
+            self._db.execute("INSERT INTO files (path, mtime, size, digest, chunks) VALUES (?, ?, ?, ?, ?)",
+                             (path, stat.st_mtime, stat.st_size, digest, len(texts)))
+        job.chunks_added += len(texts)
+
+    # -- housekeeping ----------------------------------------------------
+
+    def chunk_count(self):
+        with self._lock:
+            return int(self._live.sum())
+
+    def stats(self):
+        """Indexed files and chunks, and the size of the vector file"""
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            return {"files": files, "chunks": int(self._live.sum()), "bytes": size}
+
+    def clear(self):
+        """Forget every indexed document"""
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM chunks")
+                self._db.execute("DELETE FROM files")
+                self._db.execute("DELETE FROM meta")
+            self._vectors = None
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+            self._open()
@@ -0,0 +1,142 @@
+"""Background model downloads with per-layer progress and resume"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DATA_DIR, DOWNLOAD_CONCURRENCY
+from ollama_client import default_client
+
+# Seconds of progress samples used for the throughput estimate
+RATE_WINDOW = 5.0
+
+
+class Download:
+    """Progress of one model pull, updated from the streaming /api/pull response"""
+
+    def __init__(self, model):
+        self.model = model
+        self.state = "queued"
+        self.status = "queued"
+        self.error = None
+        self.layers = {}
+        self.started_at = None
+        self.finished_at = None
+        self._samples = deque()
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    @property
+    def completed_bytes(self):
+        return sum(layer["completed"] for layer in self.layers.values())
+
+    @property
+    def total_bytes(self):
+        return sum(layer["total"] for layer in self.layers.values())
+
+    @property
+    def fraction(self):
+        """Overall progress between 0 and 1"""
+        if self.state == "done":
+            return 1.0
+        total = self.total_bytes
+        return self.completed_bytes / total if total else 0.0
+
+    @property
+    def bytes_per_second(self):
+        """Recent download throughput"""
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def update(self, chunk):
+        """Apply one progress chunk from the pull stream"""
+        self.status = chunk.get("status", self.status)
+        digest = chunk.get("digest")
+        if digest and chunk.get("total"):
+            self.layers[digest] = {"total": chunk["total"], "completed": chunk.get("completed", 0)}
+            now = time.monotonic()
+            self._samples.append((now, self.completed_bytes))
+            while self._samples and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+
+
+class DownloadManager:
+    """Pulls models on a bounded thread pool, several at a time.
+
+    Unfinished pulls are recorded in a small JSON file; when the manager is
+    created again (e.g. after a restart) it re-issues them, and Ollama
+    resumes from the partial blobs it already has on disk.
+    """
+
+    def __init__(self, client=None, on_complete=None, max_concurrent=DOWNLOAD_CONCURRENCY,
+                 state_file=os.path.join(DATA_DIR, "downloads.json")):
+        self._client = client or default_client()
+        self._on_complete = on_complete
+        self._state_file = state_file
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self._downloads = {}
+        for model in self._load_pending():
+            self.pull(model)
+
+    def pull(self, model):
+        """Queue a model download; returns the existing one if already active"""
+        with self._lock:
+            current = self._downloads.get(model)
+            if current and current.active:
+                return current
+            download = Download(model)
+            self._downloads[model] = download
+            self._save_pending()
+        self._executor.submit(self._run, download)
+        return download
+
+    def get(self, model):
+        with self._lock:
+            return self._downloads.get(model)
+
+    def downloads(self):
+        """All downloads from this process, most recent first"""
+        with self._lock:
+            return list(reversed(self._downloads.values()))
+
+    def _run(self, download):
+        download.state = "running"
+        download.started_at = time.time()
+        try:
+            for chunk in self._client.pull(download.model, stream=True):
+                download.update(chunk)
+            download.state = "done"
+            if self._on_complete:
+                self._on_complete(download.model)
+        except Exception as e:
+            download.error = str(e)
+            download.state = "failed"
+        finally:
+            download.finished_at = time.time()
+            with self._lock:
+                self._save_pending()
+
+    def _load_pending(self):
+        try:
+            with open(self._state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save_pending(self):
+        """Record the models whose pulls haven't finished (caller holds the lock)"""
+        pending = [model for model, download in self._downloads.items() if download.active]
+        try:
+            os.makedirs(os.path.dirname(self._state_file), exist_ok=True)
+            with open(self._state_file, "w") as f:
+                json.dump(pending, f)
+        except OSError:
+            # Resume is best effort; a read-only data dir shouldn't break downloads
+            pass
@@ -0,0 +1,72 @@
+"""Token budgeting for the chat history sent to Ollama"""
+from config import CHARS_PER_TOKEN, REPLY_RESERVE_TOKENS
+
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Rough token count for a piece of text (no tokenizer needed)"""
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def message_tokens(message):
+    """Token count of a chat message, computed once and cached on the message.
+
+    The count is stored under "tokens" so long histories are not re-scanned
+    every turn; set_message_tokens() replaces the estimate with the exact
+    count when Ollama reports one.
+    """
+    if "tokens" not in message:
+        message["tokens"] = estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+    return message["tokens"]
+
+
+def set_message_tokens(message, eval_count):
+    """Record the exact token count Ollama reported for a generated message"""
+    if eval_count:
+        message["tokens"] = eval_count + MESSAGE_OVERHEAD_TOKENS
+
+
+def reply_reserve(num_ctx):
+    """Tokens kept free for the model's reply"""
+    return min(REPLY_RESERVE_TOKENS, num_ctx // 2)
+
+
+def fit_history(messages, num_ctx):
+    """Pick the most recent messages that fit in `num_ctx` minus the reply reserve.
+
+    System messages at the start of the history are always kept, as is the
+    newest message (the prompt being answered), even if it alone exceeds the
+    budget. Returns (messages to send, estimated tokens sent, messages dropped).
+    """
+    budget = num_ctx - reply_reserve(num_ctx)
+
+    pinned = []
+    for message in messages:
+        if message["role"] != "system":
+            break
+        pinned.append(message)
+    used = sum(message_tokens(message) for message in pinned)
+
+    kept = []
+    for message in reversed(messages[len(pinned):]):
+        tokens = message_tokens(message)
+        if kept and used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+
+    selected = pinned + kept
+    payload = [{"role": m["role"], "content": m["content"]} for m in selected]
+    return payload, used, len(messages) - len(selected)
+
+
+def model_history(messages, model):
+    """The conversation as `model` saw it.
+
+    Replies other models gave in a side-by-side comparison are left out,
+    so each model only ever continues its own answers.
+    """
+    return [m for m in messages if "compare" not in m or m.get("model") == model]
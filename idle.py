@@ -0,0 +1,107 @@
+"""Server-side idle tracking: unload models every session has stopped using"""
+import threading
+import time
+
+from config import IDLE_UNLOAD_TIMEOUT
+from jobs import LOAD
+from model_status import expiry_moved
+from residency import parse_timestamp
+
+
+class IdleUnloader:
+    """Unloads resident models nobody has been active with for `timeout` seconds.
+
+    Activity is what the ModelManager records for each session and model:
+    picking a model, changing settings and chatting, from any session. A
+    model is left alone while it is generating or while a live session
+    using it has auto-unload turned off, so it is only freed once all of
+    its users are idle.
+
+    Only models this process has used or loaded are candidates; the rest
+    belong to other clients of the same Ollama (another NeuralNexus
+    process such as the batch runner, the ollama CLI). Their requests still
+    renew a shared model's keep_alive, so a model whose `expires_at` moved
+    counts as active at that moment too. Unloads go through the background
+    jobs with keep_alive=0, like a click on the unload button. A timeout of
+    0 turns the unloader off.
+    """
+
+    def __init__(self, status, manager, jobs, timeout=IDLE_UNLOAD_TIMEOUT, interval=None):
+        self._status = status
+        self._manager = manager
+        self._jobs = jobs
+        self.timeout = timeout
+        # Checking ten times per timeout frees a model at most 10% late
+        self._interval = interval or min(60.0, max(1.0, timeout / 10))
+        self._lock = threading.Lock()
+        # Resident model -> (its expires_at, when that was first seen)
+        self._renewals = {}
+        self._stopped = threading.Event()
+        self.checks = 0
+        if timeout > 0:
+            threading.Thread(target=self._unload_forever, name="idle-unloader", daemon=True).start()
+
+    def idle_models(self):
+        """Resident models idle for longer than the timeout"""
+        idle = []
+        for model in sorted(self._refresh()):
+            seconds = self.idle_for(model, refresh=False)
+            if seconds is not None and seconds >= self.timeout:
+                idle.append(model)
+        return idle
+
+    def idle_for(self, model, refresh=True):
+        """Seconds since `model` was last used, counting other clients' renewals.
+
+        None if the model is in use, or isn't ours to unload because this
+        process has neither used nor loaded it.
+        """
+        if refresh:
+            self._refresh()
+        if not self._ours(model):
+            return None
+        with self._lock:
+            renewal = self._renewals.get(model)
+        return self._manager.idle_for(model, since=renewal[1] if renewal else 0.0)
+
+    def _refresh(self):
+        """Note which resident models had their expires_at renewed; returns the resident ones"""
+        now = time.monotonic()
+        resident = {entry.get("model") or entry.get("name"): parse_timestamp(entry.get("expires_at"))
+                    for entry in self._status.snapshot()}
+        with self._lock:
+            renewals = {}
+            for model, expires_at in resident.items():
+                previous = self._renewals.get(model)
+                if previous is None or expiry_moved(previous[0], expires_at):
+                    renewals[model] = (expires_at, now)
+                else:
+                    renewals[model] = previous
+            self._renewals = renewals
+        return resident
+
+    def _ours(self, model):
+        job = self._jobs.job(model)
+        return self._manager.used(model) or (job is not None and job.action == LOAD)
+
+    def check(self):
+        """Start unloading every idle model; returns the models unloaded"""
+        self.checks += 1
+        unloaded = []
+        for model in self.idle_models():
+            if not self._jobs.running(model):
+                self._jobs.unload(model)
+                unloaded.append(model)
+        return unloaded
+
+    def stop(self):
+        """Stop the timed checks"""
+        self._stopped.set()
+
+    def _unload_forever(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.check()
+            except Exception:
+                # An unreachable Ollama is retried at the next check
+                pass
@@ -0,0 +1,111 @@
+"""Background model load/unload jobs so the UI never blocks on Ollama"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_CONFIRM_TIMEOUT, JOB_WORKERS
+from ollama_client import default_client
+
+LOAD = "load"
+UNLOAD = "unload"
+
+
+class ModelJob:
+    """State of one load or unload request, readable from any session"""
+
+    def __init__(self, model, action):
+        self.model = model
+        self.action = action
+        self.state = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; False on timeout"""
+        return self._finished.wait(timeout)
+
+
+class ModelJobs:
+    """Runs model loads and unloads on a small thread pool.
+
+    Jobs for the same model run one at a time; asking for an action that is
+    already running for a model returns the running job instead of queuing a
+    duplicate. Completion is confirmed against /api/ps with backoff rather
+    than trusted from the request alone.
+    """
+
+    def __init__(self, status, client=None, on_loaded=None, on_unloaded=None, max_workers=JOB_WORKERS):
+        self._status = status
+        self._client = client or default_client()
+        self._on_loaded = on_loaded
+        self._on_unloaded = on_unloaded
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._model_locks = {}
+
+    def job(self, model):
+        """Latest job for a model, running or finished"""
+        with self._lock:
+            return self._jobs.get(model)
+
+    def running(self, model):
+        """The running job for a model, if any"""
+        job = self.job(model)
+        return job if job and job.running else None
+
+    def load(self, model, options=None, keep_alive=None, before=None):
+        """Start loading a model in the background with the given load options.
+
+        `before` runs in the job ahead of the request, e.g. to make room for
+        the model; it may wait on other jobs since they run on other workers.
+        """
+        def request():
+            if before:
+                before()
+            self._client.preload(model, options=options, keep_alive=keep_alive)
+            if self._on_loaded and options:
+                self._on_loaded(model, options)
+        return self._submit(model, LOAD, request)
+
+    def unload(self, model):
+        """Start unloading a model in the background"""
+        return self._submit(model, UNLOAD, lambda: self._client.unload(model))
+
+    def _submit(self, model, action, request):
+        with self._lock:
+            current = self._jobs.get(model)
+            if current and current.running and current.action == action:
+                return current
+            job = ModelJob(model, action)
+            self._jobs[model] = job
+            model_lock = self._model_locks.setdefault(model, threading.Lock())
+        self._executor.submit(self._run, job, model_lock, request)
+        return job
+
+    def _run(self, job, model_lock, request):
+        with model_lock:
+            try:
+                request()
+                want_loaded = job.action == LOAD
+                if not self._status.wait_for(job.model, want_loaded, timeout=JOB_CONFIRM_TIMEOUT):
+                    raise TimeoutError(f"{job.model} did not {job.action} within {JOB_CONFIRM_TIMEOUT:.0f}s")
+                if job.action == UNLOAD and self._on_unloaded:
+                    self._on_unloaded(job.model)
+                job.state = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.state = "failed"
+            finally:
+                job.finished_at = time.time()
+                job._finished.set()
@@ -0,0 +1,117 @@
+"""Model lifecycle policy: stable load options and usage-based keep_alive"""
+import threading
+import time
+from collections import deque
+
+from config import (KEEP_ALIVE_DEFAULT, KEEP_ALIVE_LOAD_FACTOR, KEEP_ALIVE_MAX,
+                    KEEP_ALIVE_MIN)
+
+# Options that change how the runner is loaded; altering any of them makes
+# Ollama reload the model and throw away its prompt (KV) cache. Sampling
+# options such as temperature are applied per request and are always safe.
+LOAD_OPTIONS = ("num_ctx", "num_gpu", "num_thread")
+
+# How many recent idle gaps per model feed the keep_alive estimate
+GAP_HISTORY = 20
+
+
+def split_options(options):
+    """Split request options into (load options, sampling options)"""
+    load = {key: value for key, value in options.items() if key in LOAD_OPTIONS}
+    sampling = {key: value for key, value in options.items() if key not in LOAD_OPTIONS}
+    return load, sampling
+
+
+def changed_load_options(current, requested):
+    """Names of load options whose value differs between two option sets"""
+    if not current:
+        return []
+    return [key for key in LOAD_OPTIONS if current.get(key) != requested.get(key)]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _ModelUsage:
+    def __init__(self):
+        self.last_used = None
+        self.gaps = deque(maxlen=GAP_HISTORY)
+        self.load_seconds = 0.0
+        self.loaded_with = None
+
+
+class LifecyclePolicy:
+    """Tracks per-model usage across sessions and derives keep_alive from it.
+
+    keep_alive covers the typical pause between requests (75th percentile
+    idle gap, with 50% headroom) and is stretched for models that are
+    expensive to load, then clamped to [KEEP_ALIVE_MIN, KEEP_ALIVE_MAX].
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._usage = {}
+
+    def _get(self, model):
+        return self._usage.setdefault(model, _ModelUsage())
+
+    def record_request(self, model, load_options, load_duration=None):
+        """Note a request to `model`; `load_duration` is Ollama's value in ns"""
+        now = self._clock()
+        with self._lock:
+            usage = self._get(model)
+            if usage.last_used is not None:
+                usage.gaps.append(now - usage.last_used)
+            usage.last_used = now
+            usage.loaded_with = dict(load_options)
+            # Only a real cold load tells us what a reload costs
+            if load_duration and load_duration / 1e9 > 1.0:
+                usage.load_seconds = load_duration / 1e9
+
+    def note_loaded(self, model, load_options):
+        """Record the load options a model was preloaded with"""
+        with self._lock:
+            self._get(model).loaded_with = dict(load_options)
+
+    def forget(self, model):
+        """Drop what we know about the runner after the model was unloaded"""
+        with self._lock:
+            if model in self._usage:
+                self._usage[model].loaded_with = None
+
+    def loaded_with(self, model):
+        """Load options the resident runner was started with, if known"""
+        with self._lock:
+            usage = self._usage.get(model)
+            return dict(usage.loaded_with) if usage and usage.loaded_with else None
+
+    def last_used(self, model):
+        """Time of the latest request to `model`, or None"""
+        with self._lock:
+            usage = self._usage.get(model)
+            return usage.last_used if usage else None
+
+    def load_seconds(self, model):
+        """Seconds the latest cold load of `model` took (0.0 if never seen)"""
+        with self._lock:
+            usage = self._usage.get(model)
+            return usage.load_seconds if usage else 0.0
+
+    def keep_alive_seconds(self, model):
+        """How long Ollama should keep `model` resident after a request"""
+        with self._lock:
+            usage = self._usage.get(model)
+            if usage is None or not usage.gaps:
+                seconds = KEEP_ALIVE_DEFAULT
+            else:
+                seconds = _percentile(usage.gaps, 0.75) * 1.5
+            if usage is not None:
+                seconds = max(seconds, usage.load_seconds * KEEP_ALIVE_LOAD_FACTOR)
+        return int(min(KEEP_ALIVE_MAX, max(KEEP_ALIVE_MIN, seconds)))
+
+    def keep_alive(self, model):
+        """keep_alive value in the duration format Ollama expects"""
+        return f"{self.keep_alive_seconds(model)}s"
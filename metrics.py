@@ -0,0 +1,156 @@
+"""Per-reply latency and throughput metrics, aggregated per model"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from config import METRICS_LOG, METRICS_WINDOW
+
+# A reply whose load_duration exceeds this loaded the model from disk
+COLD_LOAD_SECONDS = 1.0
+
+
+def _seconds(nanoseconds):
+    return nanoseconds / 1e9 if nanoseconds else 0.0
+
+
+def _rate(count, seconds):
+    return count / seconds if count and seconds else 0.0
+
+
+def reply_metrics(done, queue_seconds, ttft_seconds, total_seconds, render_seconds):
+    """Timing breakdown of one reply.
+
+    `done` is the final chunk Ollama streamed (its durations are in ns);
+    the other values are measured by the app: time spent waiting for a
+    generation slot, time from submitting to the first token on screen,
+    wall time of the whole reply, and time spent redrawing the stream.
+    """
+    load = _seconds(done.get("load_duration"))
+    prefill = _seconds(done.get("prompt_eval_duration"))
+    generation = _seconds(done.get("eval_duration"))
+    return {
+        "queue": round(queue_seconds, 4),
+        "ttft": round(ttft_seconds, 4) if ttft_seconds is not None else None,
+        "total": round(total_seconds, 4),
+        "render": round(render_seconds, 4),
+        "server": round(_seconds(done.get("total_duration")), 4),
+        "load": round(load, 4),
+        "cold": load > COLD_LOAD_SECONDS,
+        "prompt_tokens": done.get("prompt_eval_count") or 0,
+        "prefill": round(prefill, 4),
+        "prefill_tps": round(_rate(done.get("prompt_eval_count"), prefill), 1),
+        "eval_tokens": done.get("eval_count") or 0,
+        "eval": round(generation, 4),
+        "tps": round(_rate(done.get("eval_count"), generation), 1),
+    }
+
+
+def metrics_caption(metrics):
+    """One-line summary of a reply's metrics for display under the message"""
+    parts = []
+    if metrics["ttft"] is not None:
+        parts.append(f"first token {metrics['ttft']:.2f}s")
+    parts.append(f"{metrics['tps']:.1f} tok/s")
+    if metrics["cold"]:
+        parts.append(f"cold load {metrics['load']:.1f}s")
+    parts.append(f"prefill {metrics['prompt_tokens']} tok in {metrics['prefill']:.2f}s")
+    if metrics["queue"] >= 0.01:
+        parts.append(f"queued {metrics['queue']:.2f}s")
+    parts.append(f"render {metrics['render'] * 1000:.0f} ms")
+    return " · ".join(parts)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0.0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class MetricsRegistry:
+    """Keeps the latest reply metrics per model and exports them.
+
+    Each model keeps its last `window` replies. When `log_path` is set,
+    every reply is also appended to that file as one JSON line.
+    """
+
+    def __init__(self, window=METRICS_WINDOW, log_path=METRICS_LOG, clock=time.time):
+        self._window = window
+        self._log_path = log_path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._replies = {}
+
+    def record(self, model, metrics):
+        record = {"time": round(self._clock(), 3), "model": model, **metrics}
+        with self._lock:
+            self._replies.setdefault(model, deque(maxlen=self._window)).append(record)
+            if self._log_path:
+                os.makedirs(os.path.dirname(self._log_path) or ".", exist_ok=True)
+                with open(self._log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(record) + "\n")
+
+    def records(self):
+        with self._lock:
+            return [record for replies in self._replies.values() for record in replies]
+
+    def summary(self):
+        """Aggregates per model: TTFT percentiles, throughput and cold vs warm load"""
+        with self._lock:
+            replies = {model: list(records) for model, records in self._replies.items()}
+        rows = []
+        for model, records in sorted(replies.items()):
+            ttft = [r["ttft"] for r in records if r["ttft"] is not None]
+            tps = [r["tps"] for r in records if r["tps"]]
+            cold = [r["load"] for r in records if r["cold"]]
+            warm = [r["load"] for r in records if not r["cold"]]
+            rows.append({
+                "model": model,
+                "replies": len(records),
+                "ttft_p50": percentile(ttft, 0.5),
+                "ttft_p95": percentile(ttft, 0.95),
+                "tps_p50": percentile(tps, 0.5),
+                "cold_loads": len(cold),
+                "cold_load_p50": percentile(cold, 0.5),
+                "warm_load_p50": percentile(warm, 0.5),
+            })
+        return rows
+
+    def jsonl(self):
+        """All kept replies as JSON lines"""
+        return "".join(json.dumps(record) + "\n" for record in self.records())
+
+    def prometheus(self):
+        """Per-model aggregates in the Prometheus text exposition format"""
+        with self._lock:
+            replies = {model: list(records) for model, records in self._replies.items()}
+        summaries = (
+            ("neuralnexus_ttft_seconds", "Time from submitting a prompt to its first token", "ttft"),
+            ("neuralnexus_tokens_per_second", "Generation throughput reported by Ollama", "tps"),
+            ("neuralnexus_queue_seconds", "Time a prompt waited for a generation slot", "queue"),
+            ("neuralnexus_prefill_seconds", "Prompt evaluation time reported by Ollama", "prefill"),
+            ("neuralnexus_render_seconds", "Time spent redrawing a streamed reply", "render"),
+        )
+        lines = []
+        for name, help_text, key in summaries:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for model, records in sorted(replies.items()):
+                values = [r[key] for r in records if r[key] is not None]
+                for quantile in (0.5, 0.95):
+                    lines.append(f'{name}{{model="{model}",quantile="{quantile}"}} '
+                                 f'{percentile(values, quantile)}')
+                lines.append(f'{name}_sum{{model="{model}"}} {round(sum(values), 4)}')
+                lines.append(f'{name}_count{{model="{model}"}} {len(values)}')
+        lines += ["# HELP neuralnexus_load_seconds Model load time reported by Ollama",
+                  "# TYPE neuralnexus_load_seconds summary"]
+        for model, records in sorted(replies.items()):
+            for kind, cold in (("cold", True), ("warm", False)):
+                values = [r["load"] for r in records if r["cold"] is cold]
+                labels = f'model="{model}",load="{kind}"'
+                lines.append(f'neuralnexus_load_seconds_sum{{{labels}}} {round(sum(values), 4)}')
+                lines.append(f'neuralnexus_load_seconds_count{{{labels}}} {len(values)}')
+        return "\n".join(lines) + "\n"
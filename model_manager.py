@@ -0,0 +1,149 @@
+"""Process-wide coordination of shared models across browser sessions"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from config import SESSION_TIMEOUT
+
+
+class _Session:
+    def __init__(self, model):
+        self.model = model
+        self.auto_unload = True
+        self.last_seen = self.last_active = time.monotonic()
+        # Models this session is streaming from; a comparison streams several at once
+        self.generating = Counter()
+
+
+class ModelManager:
+    """Reference-counts the sessions that use each model.
+
+    Every session reports the model it has selected on each run; a session
+    that hasn't been seen for SESSION_TIMEOUT seconds no longer counts. A
+    model may only be unloaded when no other session is using it and no
+    generation is streaming from it, and a shared model keeps the load
+    options it was started with.
+
+    It also keeps the last activity of every session and model, so models
+    can be unloaded once all of their users have gone idle.
+    """
+
+    def __init__(self, status, policy, session_timeout=SESSION_TIMEOUT):
+        self._status = status
+        self._policy = policy
+        self._session_timeout = session_timeout
+        self._lock = threading.Lock()
+        self._sessions = {}
+        # Model -> last activity of any session using it
+        self._activity = {}
+
+    def touch(self, session_id, model, auto_unload=None):
+        """Record that a session is alive and active with `model`, and whether it allows auto-unload"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(model)
+            session.model = model
+            session.last_seen = session.last_active = now
+            if auto_unload is not None:
+                session.auto_unload = auto_unload
+            self._activity[model] = now
+
+    def seen(self, session_id):
+        """Keep a session alive without counting it as activity"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_seen = time.monotonic()
+
+    def release(self, session_id):
+        """Forget a session (e.g. when it is known to be closed)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _live_sessions(self):
+        # Caller holds the lock
+        cutoff = time.monotonic() - self._session_timeout
+        for session_id in [sid for sid, s in self._sessions.items()
+                           if s.last_seen < cutoff and not s.generating]:
+            del self._sessions[session_id]
+        return self._sessions
+
+    def active(self):
+        """Whether any session is alive"""
+        with self._lock:
+            return bool(self._live_sessions())
+
+    def used(self, model):
+        """Whether any session has ever been active with `model`"""
+        with self._lock:
+            return model in self._activity
+
+    def idle_for(self, model, since=0.0):
+        """Seconds since any session was active with `model` (or since `since`), None if in use.
+
+        A model is in use while it is generating, or while a live session
+        using it has auto-unload turned off.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last_active = max(self._activity.get(model, 0.0), since)
+            for session in self._live_sessions().values():
+                if session.generating[model]:
+                    return None
+                if session.model == model:
+                    if not session.auto_unload:
+                        return None
+                    last_active = max(last_active, session.last_active)
+        return now - last_active
+
+    def users(self, model):
+        """IDs of live sessions that have `model` selected or are generating with it"""
+        with self._lock:
+            return {session_id for session_id, session in self._live_sessions().items()
+                    if session.model == model or session.generating[model]}
+
+    def other_users(self, session_id, model):
+        """Live sessions other than `session_id` that use `model`"""
+        return self.users(model) - {session_id}
+
+    def generations(self, model):
+        """Number of generations currently streaming from `model`"""
+        with self._lock:
+            return sum(session.generating[model] for session in self._sessions.values())
+
+    @contextmanager
+    def generating(self, session_id, model):
+        """Mark a session as streaming from `model` for the duration of the block"""
+        self.touch(session_id, model)
+        with self._lock:
+            self._sessions[session_id].generating[model] += 1
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None:
+                    session.generating[model] -= 1
+                    if session.generating[model] <= 0:
+                        del session.generating[model]
+                    session.last_seen = session.last_active = now
+                self._activity[model] = now
+
+    def can_unload(self, session_id, model):
+        """Whether `session_id` may unload `model`, and why not if it may not"""
+        if self.generations(model):
+            return False, f"{model} is generating a reply"
+        others = len(self.other_users(session_id, model))
+        if others:
+            return False, f"{model} is in use by {others} other session{'s' if others > 1 else ''}"
+        return True, None
+
+    def shared_load_options(self, session_id, model):
+        """Load options every session must use while `model` is shared, else None"""
+        if not self.other_users(session_id, model):
+            return None
+        return self._policy.loaded_with(model)
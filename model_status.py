@@ -0,0 +1,177 @@
+"""Shared, TTL-bounded view of which models Ollama currently has in memory"""
+import threading
+import time
+from collections import deque
+
+from config import STATUS_POLL_INTERVAL, STATUS_TTL
+from ollama_client import default_client
+from residency import parse_timestamp
+
+LOADED = "loaded"
+UNLOADED = "unloaded"
+EXPIRY = "expiry"
+
+# Status events kept for sessions catching up on what changed
+EVENT_HISTORY = 100
+
+# Smaller moves of a model's expiry are rounding, not a renewed keep_alive
+EXPIRY_TOLERANCE = 1.0
+
+
+class StatusCache:
+    """Caches one /api/ps snapshot for `ttl` seconds, shared by every caller.
+
+    Concurrent callers that find the snapshot stale wait on the same fetch
+    instead of each polling Ollama. Failed polls are cached as "nothing
+    loaded" for the same TTL so an unreachable host isn't hammered either.
+    """
+
+    def __init__(self, client=None, ttl=STATUS_TTL):
+        self._client = client or default_client()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._models = None
+        self._fetched_at = 0.0
+
+    def snapshot(self):
+        """Return the running models, polling Ollama only if the cache is stale"""
+        with self._lock:
+            if self._models is None or time.monotonic() - self._fetched_at >= self.ttl:
+                self._poll()
+            return self._models
+
+    def refresh(self):
+        """Poll Ollama now, regardless of the snapshot's age"""
+        with self._lock:
+            self._poll()
+            return self._models
+
+    def _poll(self):
+        # Caller holds the lock
+        try:
+            self._models = self._client.ps()
+        except Exception:
+            # For any error, assume nothing is loaded until the next poll
+            self._models = []
+        self._fetched_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next read polls Ollama"""
+        with self._lock:
+            self._models = None
+
+    def is_loaded(self, model_name):
+        """Check whether `model_name` appears in the current snapshot"""
+        if not model_name:
+            return False
+        return any(model.get('model') == model_name for model in self.snapshot())
+
+    def wait_for(self, model_name, loaded, timeout, initial_delay=0.1, max_delay=2.0):
+        """Poll until `model_name` is (or is no longer) loaded, backing off between polls.
+
+        Returns False if the state wasn't reached within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while True:
+            self.invalidate()
+            if self.is_loaded(model_name) == loaded:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+
+def expiry_moved(before, after):
+    """Whether a model's expiry changed between two snapshots, i.e. its keep_alive was renewed"""
+    if before is None or after is None:
+        return before is not after
+    return abs((after - before).total_seconds()) > EXPIRY_TOLERANCE
+
+
+class StatusEvent:
+    """One change between /api/ps snapshots: a model loaded, unloaded or got a new expiry"""
+
+    def __init__(self, version, kind, model, expires_at=None):
+        self.version = version
+        self.kind = kind
+        self.model = model
+        self.expires_at = expires_at
+        self.time = time.time()
+
+
+class StatusWatcher:
+    """Background poller that turns /api/ps snapshots into status events.
+
+    While `active()` is true it refreshes the shared StatusCache every
+    `interval` seconds, so readers never poll Ollama themselves, and diffs
+    each snapshot against the previous one: models that appeared (loaded),
+    disappeared (unloaded, including Ollama expiring them) or whose
+    `expires_at` moved (their keep_alive was renewed or changed). Each
+    change bumps `version` and is pushed to the subscribed callbacks;
+    sessions catch up with events_since().
+    """
+
+    def __init__(self, status, active=lambda: True, interval=STATUS_POLL_INTERVAL):
+        self._status = status
+        self._active = active
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._models = None
+        self._events = deque(maxlen=EVENT_HISTORY)
+        self._subscribers = []
+        self._stopped = threading.Event()
+        self.version = 0
+        self.polls = 0
+        threading.Thread(target=self._watch_forever, name="status-watcher", daemon=True).start()
+
+    def subscribe(self, callback):
+        """Call `callback(event)` from the watcher thread for every change"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def events_since(self, version):
+        """Events newer than `version`, oldest first"""
+        with self._lock:
+            return [event for event in self._events if event.version > version]
+
+    def check(self):
+        """Diff the current snapshot against the last one and publish the changes"""
+        models = {entry.get("model") or entry.get("name"): parse_timestamp(entry.get("expires_at"))
+                  for entry in self._status.snapshot()}
+        with self._lock:
+            previous, self._models = self._models, models
+            if previous is None:
+                return []
+            changes = [(LOADED, name) for name in models if name not in previous]
+            changes += [(UNLOADED, name) for name in previous if name not in models]
+            changes += [(EXPIRY, name) for name in models
+                        if name in previous and expiry_moved(previous[name], models[name])]
+            events = []
+            for kind, name in changes:
+                self.version += 1
+                events.append(StatusEvent(self.version, kind, name, models.get(name)))
+            self._events.extend(events)
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception:
+                    # A failing subscriber mustn't stop status updates for everyone else
+                    pass
+        return events
+
+    def stop(self):
+        """Stop polling; the status cache goes back to polling on reads"""
+        self._stopped.set()
+
+    def _watch_forever(self):
+        while not self._stopped.is_set():
+            if self._active():
+                self._status.refresh()
+                self.polls += 1
+                self.check()
+            self._stopped.wait(self._interval)
@@ -0,0 +1,279 @@
+"""Pooled HTTP transport for every request NeuralNexus makes to Ollama"""
+import json
+import threading
+
+import httpx
+
+from config import (OLLAMA_CONNECT_TIMEOUT, OLLAMA_HOST, OLLAMA_MAX_CONNECTIONS,
+                    OLLAMA_RETRIES, OLLAMA_TIMEOUT)
+
+# Generation and pulls can legitimately go quiet for minutes while a model
+# loads or a layer verifies, so streamed reads never time out on their own
+STREAM_TIMEOUT = httpx.Timeout(None, connect=OLLAMA_CONNECT_TIMEOUT)
+
+
+class OllamaError(Exception):
+    """Raised when Ollama answers with an error status or error payload"""
+
+    def __init__(self, message, status_code=None, missing_route=False):
+        super().__init__(message)
+        self.status_code = status_code
+        # A 404 from the router ("404 page not found") rather than an API
+        # error such as a missing model, which comes as JSON {"error": ...}
+        self.missing_route = missing_route
+
+
+def _error_from(response):
+    """Build an OllamaError from a failed response"""
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and 'error' in payload:
+        return OllamaError(payload['error'] or f"HTTP {response.status_code}", response.status_code)
+    return OllamaError(response.text or f"HTTP {response.status_code}", response.status_code,
+                       missing_route=response.status_code == 404)
+
+
+def _parse_line(line):
+    """Decode one NDJSON line of a streamed response"""
+    chunk = json.loads(line)
+    if 'error' in chunk:
+        raise OllamaError(chunk['error'])
+    return chunk
+
+
+def _options(kwargs):
+    """Drop unset optional fields so Ollama applies its own defaults"""
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+class _Settings:
+    """Connection settings shared by the sync and async clients"""
+
+    def __init__(self, host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT, retries=OLLAMA_RETRIES,
+                 max_connections=OLLAMA_MAX_CONNECTIONS):
+        self.host = host.rstrip('/')
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        # Keep every pooled connection alive between reruns
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        # Transport-level retries only cover failed connection attempts, so
+        # they are safe for POSTs too: nothing reached Ollama
+        self.retries = retries
+
+
+class OllamaClient:
+    """Keep-alive, connection-pooled client for the Ollama REST API.
+
+    Point it at a remote host or a local stub server with OLLAMA_HOST.
+    Streaming methods return generators of decoded JSON chunks, matching
+    the shape of the `ollama` package's responses.
+    """
+
+    def __init__(self, **settings):
+        self.settings = _Settings(**settings)
+        self._http = httpx.Client(
+            base_url=self.settings.host,
+            timeout=self.settings.timeout,
+            transport=httpx.HTTPTransport(retries=self.settings.retries,
+                                          limits=self.settings.limits),
+        )
+
+    @property
+    def host(self):
+        return self.settings.host
+
+    def close(self):
+        self._http.close()
+
+    def _request(self, method, path, timeout=None, **kwargs):
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        response = self._http.request(method, path, **kwargs)
+        if response.is_error:
+            raise _error_from(response)
+        return response.json() if response.content else {}
+
+    def _stream(self, path, payload):
+        with self._http.stream('POST', path, json=payload, timeout=STREAM_TIMEOUT) as response:
+            if response.is_error:
+                response.read()
+                raise _error_from(response)
+            for line in response.iter_lines():
+                if line:
+                    yield _parse_line(line)
+
+    def ps(self, timeout=2.0):
+        """Return the models currently loaded in memory"""
+        return self._request('GET', '/api/ps', timeout=timeout).get('models', [])
+
+    def list(self):
+        """Return installed models, shaped like `ollama.list()`"""
+        return self._request('GET', '/api/tags')
+
+    def show(self, model):
+        """Return the modelfile, template, parameters and details of a model"""
+        return self._request('POST', '/api/show', json={'name': model})
+
+    def delete(self, model):
+        """Delete an installed model"""
+        return self._request('DELETE', '/api/delete', json={'name': model})
+
+    def generate(self, model, prompt='', stream=False, options=None, keep_alive=None, timeout=None):
+        """Run /api/generate; an empty prompt only loads (or unloads) the model"""
+        payload = _options({'model': model, 'prompt': prompt, 'stream': stream,
+                            'options': options, 'keep_alive': keep_alive})
+        if stream:
+            return self._stream('/api/generate', payload)
+        return self._request('POST', '/api/generate', json=payload,
+                             timeout=timeout if timeout is not None else STREAM_TIMEOUT)
+
+    def chat(self, model, messages, stream=False, options=None, keep_alive=None):
+        """Run /api/chat, returning a chunk generator when `stream` is set"""
+        payload = _options({'model': model, 'messages': messages, 'stream': stream,
+                            'options': options, 'keep_alive': keep_alive})
+        if stream:
+            return self._stream('/api/chat', payload)
+        return self._request('POST', '/api/chat', json=payload, timeout=STREAM_TIMEOUT)
+
+    def pull(self, model, stream=False):
+        """Download a model, returning a progress generator when `stream` is set"""
+        payload = {'name': model, 'stream': stream}
+        if stream:
+            return self._stream('/api/pull', payload)
+        return self._request('POST', '/api/pull', json=payload, timeout=STREAM_TIMEOUT)
+
+    def preload(self, model, options=None, keep_alive=None, timeout=None):
+        """Load a model into memory without generating anything"""
+        return self.generate(model, options=options, keep_alive=keep_alive, timeout=timeout)
+
+    def unload(self, model, timeout=None):
+        """Ask Ollama to evict a model from memory right away"""
+        return self.generate(model, keep_alive=0, timeout=timeout)
+
+    def embed(self, model, inputs, keep_alive=None):
+        """Embed a batch of texts, returning one vector per input"""
+        payload = _options({'model': model, 'input': inputs, 'keep_alive': keep_alive})
+        try:
+            return self._request('POST', '/api/embed', json=payload, timeout=STREAM_TIMEOUT)['embeddings']
+        except OllamaError as e:
+            if not e.missing_route:
+                raise
+        # Ollama before 0.3 only has the one-prompt-per-request endpoint
+        return [self._request('POST', '/api/embeddings', json={'model': model, 'prompt': text},
+                              timeout=STREAM_TIMEOUT)['embedding']
+                for text in inputs]
+
+
+class AsyncOllamaClient:
+    """asyncio counterpart of OllamaClient sharing one pooled connection set.
+
+    Streaming methods must be awaited and return async generators:
+    `async for chunk in await client.chat(model, messages, stream=True)`.
+    """
+
+    def __init__(self, **settings):
+        self.settings = _Settings(**settings)
+        self._http = httpx.AsyncClient(
+            base_url=self.settings.host,
+            timeout=self.settings.timeout,
+            transport=httpx.AsyncHTTPTransport(retries=self.settings.retries,
+                                               limits=self.settings.limits),
+        )
+
+    @property
+    def host(self):
+        return self.settings.host
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _request(self, method, path, timeout=None, **kwargs):
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        response = await self._http.request(method, path, **kwargs)
+        if response.is_error:
+            raise _error_from(response)
+        return response.json() if response.content else {}
+
+    async def _stream(self, path, payload):
+        async with self._http.stream('POST', path, json=payload, timeout=STREAM_TIMEOUT) as response:
+            if response.is_error:
+                await response.aread()
+                raise _error_from(response)
+            async for line in response.aiter_lines():
+                if line:
+                    yield _parse_line(line)
+
+    async def ps(self, timeout=2.0):
+        response = await self._request('GET', '/api/ps', timeout=timeout)
+        return response.get('models', [])
+
+    async def list(self):
+        return await self._request('GET', '/api/tags')
+
+    async def show(self, model):
+        return await self._request('POST', '/api/show', json={'name': model})
+
+    async def delete(self, model):
+        return await self._request('DELETE', '/api/delete', json={'name': model})
+
+    async def generate(self, model, prompt='', stream=False, options=None, keep_alive=None, timeout=None):
+        payload = _options({'model': model, 'prompt': prompt, 'stream': stream,
+                            'options': options, 'keep_alive': keep_alive})
+        if stream:
+            return self._stream('/api/generate', payload)
+        return await self._request('POST', '/api/generate', json=payload,
+                                   timeout=timeout if timeout is not None else STREAM_TIMEOUT)
+
+    async def chat(self, model, messages, stream=False, options=None, keep_alive=None):
+        payload = _options({'model': model, 'messages': messages, 'stream': stream,
+                            'options': options, 'keep_alive': keep_alive})
+        if stream:
+            return self._stream('/api/chat', payload)
+        return await self._request('POST', '/api/chat', json=payload, timeout=STREAM_TIMEOUT)
+
+    async def pull(self, model, stream=False):
+        payload = {'name': model, 'stream': stream}
+        if stream:
+            return self._stream('/api/pull', payload)
+        return await self._request('POST', '/api/pull', json=payload, timeout=STREAM_TIMEOUT)
+
+    async def preload(self, model, options=None, keep_alive=None, timeout=None):
+        return await self.generate(model, options=options, keep_alive=keep_alive, timeout=timeout)
+
+    async def unload(self, model, timeout=None):
+        return await self.generate(model, keep_alive=0, timeout=timeout)
+
+    async def embed(self, model, inputs, keep_alive=None):
+        payload = _options({'model': model, 'input': inputs, 'keep_alive': keep_alive})
+        try:
+            response = await self._request('POST', '/api/embed', json=payload, timeout=STREAM_TIMEOUT)
+            return response['embeddings']
+        except OllamaError as e:
+            if not e.missing_route:
+                raise
+        return [(await self._request('POST', '/api/embeddings', json={'model': model, 'prompt': text},
+                                     timeout=STREAM_TIMEOUT))['embedding']
+                for text in inputs]
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Return the process-wide OllamaClient, creating it on first use"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
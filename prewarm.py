@@ -0,0 +1,184 @@
+"""Predictive model prewarming from per-user, time-of-day usage history"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DATA_DIR, PREWARM_ENABLED, PREWARM_MIN_SCORE
+
+# Team-wide history is used for users with fewer requests than this
+MIN_USER_REQUESTS = 5
+
+# Counts are halved once a user's total passes this, so old habits fade
+MAX_USER_REQUESTS = 1000
+
+TEAM = "*"
+
+HIT = "hit"
+WASTED = "wasted"
+
+
+class UsageHistory:
+    """Which models each user asks for at which hour of the day.
+
+    Every chat request is counted under its user and under the whole team.
+    predict() scores models for an hour from the requests made in that hour
+    and its neighbours. Prewarms are tracked until the model is used (a hit)
+    or its keep_alive runs out unused (wasted), and outcomes are counted
+    per reason so the policy can be tuned. Everything is kept in a JSON
+    file in the data directory.
+    """
+
+    def __init__(self, path=os.path.join(DATA_DIR, "usage.json"), clock=time.time):
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        state = self._load()
+        self._counts = state.get("counts", {})
+        self._outcomes = state.get("outcomes", {})
+        # model -> (reason, expires); only live for this process
+        self._pending = {}
+
+    def _hour(self):
+        return time.localtime(self._clock()).tm_hour
+
+    def record_request(self, user, model):
+        """Count a chat request, settling a pending prewarm of `model` as a hit"""
+        hour = str(self._hour())
+        with self._lock:
+            for key in {user, TEAM}:
+                hours = self._counts.setdefault(key, {})
+                models = hours.setdefault(hour, {})
+                models[model] = models.get(model, 0) + 1
+                if sum(sum(m.values()) for m in hours.values()) > MAX_USER_REQUESTS:
+                    self._counts[key] = {h: {name: count / 2 for name, count in m.items()}
+                                         for h, m in hours.items()}
+            self._settle()
+            pending = self._pending.pop(model, None)
+            if pending:
+                self._count_outcome(pending[0], HIT)
+            self._save()
+
+    def predict(self, user):
+        """Models scored by how often they are used around this hour, best first.
+
+        A score is the model's share of the requests made in this hour and
+        the neighbouring ones (this hour counting double).
+        """
+        hour = self._hour()
+        with self._lock:
+            hours = self._counts.get(user, {})
+            if sum(sum(m.values()) for m in hours.values()) < MIN_USER_REQUESTS:
+                hours = self._counts.get(TEAM, {})
+            scores = {}
+            for offset, weight in ((-1, 1), (0, 2), (1, 1)):
+                for model, count in hours.get(str((hour + offset) % 24), {}).items():
+                    scores[model] = scores.get(model, 0) + weight * count
+        total = sum(scores.values())
+        if not total:
+            return []
+        return sorted(((model, score / total) for model, score in scores.items()),
+                      key=lambda item: item[1], reverse=True)
+
+    def record_prewarm(self, model, reason, keep_alive_seconds):
+        """Track a prewarm until the model is used or its keep_alive runs out"""
+        with self._lock:
+            self._settle()
+            # An earlier prewarm of the same model was unloaded before anyone used it
+            earlier = self._pending.pop(model, None)
+            if earlier:
+                self._count_outcome(earlier[0], WASTED)
+            self._pending[model] = (reason, self._clock() + keep_alive_seconds)
+            self._save()
+
+    def outcomes(self):
+        """Hit and wasted prewarm counts per reason"""
+        with self._lock:
+            self._settle()
+            return {reason: dict(counts) for reason, counts in self._outcomes.items()}
+
+    def _settle(self):
+        # Caller holds the lock
+        now = self._clock()
+        expired = [model for model, (_, expires) in self._pending.items() if now >= expires]
+        for model in expired:
+            self._count_outcome(self._pending.pop(model)[0], WASTED)
+        if expired:
+            self._save()
+
+    def _count_outcome(self, reason, outcome):
+        # Caller holds the lock
+        counts = self._outcomes.setdefault(reason, {HIT: 0, WASTED: 0})
+        counts[outcome] += 1
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # Caller holds the lock
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, "w") as f:
+                json.dump({"counts": self._counts, "outcomes": self._outcomes}, f)
+        except OSError:
+            # Usage history is best effort; a read-only data dir shouldn't break chat
+            pass
+
+
+class Prewarmer:
+    """Preloads models in the background before the first chat needs them.
+
+    Both prewarm methods return at once; the work (making room and loading) runs on
+    one background thread. A model the user just selected may unload idle
+    models to fit like a chat request would, but a merely predicted one is
+    only loaded into memory that is already free.
+    """
+
+    def __init__(self, history, residency, jobs, status, policy, enabled=PREWARM_ENABLED,
+                 min_score=PREWARM_MIN_SCORE):
+        self.history = history
+        self._residency = residency
+        self._jobs = jobs
+        self._status = status
+        self._policy = policy
+        self.enabled = enabled
+        self.min_score = min_score
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prewarm")
+
+    def prewarm_selected(self, session_id, model, options):
+        """Load a model the user just picked"""
+        self._submit(session_id, model, options, "selected", evict=True)
+
+    def prewarm_predicted(self, session_id, user, installed, options):
+        """Load the model this user most likely wants at this time of day; returns it or None"""
+        for model, score in self.history.predict(user):
+            if score < self.min_score:
+                return None
+            if model in installed:
+                self._submit(session_id, model, options, "predicted", evict=False)
+                return model
+        return None
+
+    def _submit(self, session_id, model, options, reason, evict):
+        if self.enabled and model:
+            self._executor.submit(self._prewarm, session_id, model, options, reason, evict)
+
+    def _prewarm(self, session_id, model, options, reason, evict):
+        try:
+            if self._status.is_loaded(model) or self._jobs.running(model):
+                return
+            if evict:
+                self._residency.make_room(session_id, [model])
+            elif self._residency.evictions(session_id, [model]):
+                # Speculation never pushes another model out of memory
+                return
+            self._jobs.load(model, options=options, keep_alive=self._policy.keep_alive(model))
+            self.history.record_prewarm(model, reason, self._policy.keep_alive_seconds(model))
+        except Exception:
+            # Prewarming is an optimization; the first chat loads the model anyway
+            pass
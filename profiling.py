@@ -0,0 +1,39 @@
+"""Phase timing for Streamlit script runs (enable with NEURALNEXUS_PROFILE=1)"""
+import logging
+import time
+
+from config import PROFILE
+
+logger = logging.getLogger("neuralnexus.profile")
+if PROFILE and not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class PhaseTimer:
+    """Records how long each phase of one script run took.
+
+    Call mark() at the end of each phase and report() at the end of the
+    run; the report is only logged when profiling is enabled.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._start = self._last = clock()
+        self.phases = []
+
+    def mark(self, name):
+        now = self._clock()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self._start
+
+    def report(self):
+        if PROFILE:
+            phases = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases)
+            logger.info("run %.1f ms (%s)", self.total * 1000, phases)
@@ -0,0 +1,167 @@
+"""Memory-aware model residency: what Ollama holds, what it costs, what to evict"""
+import os
+import re
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from config import EVICTION_POLICY, JOB_CONFIRM_TIMEOUT, MEMORY_BUDGET_GB, OLLAMA_HOST
+
+GB = 1024 ** 3
+
+# Share of physical memory models may use when Ollama runs on this machine
+LOCAL_MEMORY_SHARE = 0.8
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "0.0.0.0")
+
+# Ollama reports nanosecond timestamps; datetime takes at most microseconds
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def parse_timestamp(value):
+    """Parse an Ollama RFC 3339 timestamp into an aware datetime, or None"""
+    if not value:
+        return None
+    value = _FRACTION.sub(r"\1", value.replace("Z", "+00:00"))
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def memory_budget(host=OLLAMA_HOST, budget_gb=MEMORY_BUDGET_GB):
+    """Bytes resident models may use together, or None when unknown.
+
+    The configured budget wins; otherwise a local Ollama may use most of
+    this machine's RAM, and a remote one is not limited.
+    """
+    if budget_gb > 0:
+        return int(budget_gb * GB)
+    if urlparse(host).hostname not in LOCAL_HOSTS:
+        return None
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * LOCAL_MEMORY_SHARE)
+    except (AttributeError, ValueError, OSError):
+        # No sysconf on this platform
+        return None
+
+
+class ResidentModel:
+    """One model Ollama has in memory, as reported by /api/ps"""
+
+    def __init__(self, entry):
+        self.name = entry.get("model") or entry.get("name")
+        self.size = entry.get("size", 0)
+        self.size_vram = entry.get("size_vram", 0)
+        self.expires_at = parse_timestamp(entry.get("expires_at"))
+
+    @property
+    def vram_fraction(self):
+        """Share of the model held in GPU memory"""
+        return self.size_vram / self.size if self.size else 0.0
+
+    @property
+    def expires_in(self):
+        """Seconds until Ollama unloads the model on its own, if known"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, (self.expires_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class ResidencyManager:
+    """Keeps resident models within the memory budget.
+
+    Footprints are learned from /api/ps whenever a model is resident (the
+    on-disk size stands in until then). Before a model loads, make_room()
+    unloads other resident models until it fits: least recently used first,
+    or with the "cost" policy the ones cheapest to reload for how long they
+    have been idle. Models other sessions are using are never evicted.
+
+    With an IdleUnloader given, neither are models this process hasn't used
+    or loaded, which belong to other clients of the same Ollama, and a
+    model those clients renewed counts as used at that moment.
+    """
+
+    def __init__(self, status, catalog, policy, manager, jobs, budget=None,
+                 eviction=EVICTION_POLICY, clock=time.time, idle=None):
+        self._status = status
+        self._catalog = catalog
+        self._policy = policy
+        self._manager = manager
+        self._jobs = jobs
+        self.budget = budget if budget is not None else memory_budget()
+        self.eviction = eviction
+        self._clock = clock
+        self._idle = idle
+        self._footprints = {}
+
+    def resident(self):
+        """Models currently in memory, largest first"""
+        models = [ResidentModel(entry) for entry in self._status.snapshot()]
+        for model in models:
+            if model.size:
+                self._footprints[model.name] = model.size
+        return sorted(models, key=lambda model: model.size, reverse=True)
+
+    def used(self):
+        """Bytes the resident models occupy"""
+        return sum(model.size for model in self.resident())
+
+    def footprint(self, model):
+        """Memory `model` takes when loaded: last seen in /api/ps, else its file size"""
+        if model in self._footprints:
+            return self._footprints[model]
+        try:
+            return self._catalog.models().get(model, {}).get("size", 0)
+        except Exception:
+            return 0
+
+    def _eviction_order(self, model, idle_seconds):
+        last_used = self._policy.last_used(model.name) or 0.0
+        if idle_seconds is not None:
+            last_used = max(last_used, self._clock() - idle_seconds)
+        if self.eviction == "cost":
+            idle = max(1.0, self._clock() - last_used)
+            return self._policy.load_seconds(model.name) / idle
+        return last_used
+
+    def evictions(self, session_id, models):
+        """Resident models to unload so that `models` fit in the budget"""
+        if not self.budget:
+            return []
+        resident = self.resident()
+        resident_names = {model.name for model in resident}
+        needed = sum(self.footprint(model) for model in models if model not in resident_names)
+        free = self.budget - sum(model.size for model in resident)
+        if needed <= free:
+            return []
+        candidates = {}
+        for model in resident:
+            if model.name in models or not self._manager.can_unload(session_id, model.name)[0]:
+                continue
+            idle_seconds = None
+            if self._idle is not None:
+                idle_seconds = self._idle.idle_for(model.name)
+                if idle_seconds is None:
+                    continue
+            candidates[model] = idle_seconds
+        victims = []
+        for model in sorted(candidates, key=lambda model: self._eviction_order(model, candidates[model])):
+            if needed <= free:
+                break
+            victims.append(model.name)
+            free += model.size
+        return victims
+
+    def make_room(self, session_id, models, timeout=JOB_CONFIRM_TIMEOUT):
+        """Unload resident models until `models` fit, waiting for Ollama to confirm.
+
+        Returns the names of the models that were unloaded.
+        """
+        victims = self.evictions(session_id, models)
+        jobs = [self._jobs.unload(model) for model in victims]
+        deadline = time.monotonic() + timeout
+        for job in jobs:
+            job.wait(max(0.0, deadline - time.monotonic()))
+        if victims:
+            self._status.invalidate()
+        return victims
@@ -0,0 +1,141 @@
+"""On-disk cache of replies to deterministic prompts (SQLite, size-bounded LRU)"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config import DATA_DIR, RESPONSE_CACHE_MAX_MB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    done TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS replies_by_use ON replies (used_at);
+"""
+
+# A cached reply is replayed as a stream lasting about this long
+REPLAY_SECONDS = 0.25
+
+_PIECES = re.compile(r"\s*\S+\s*|\s+")
+
+
+def normalize_messages(messages):
+    """Role and content of each message, with line endings and trailing whitespace unified"""
+    normalized = []
+    for message in messages:
+        content = message["content"].replace("\r\n", "\n").strip()
+        normalized.append({"role": message["role"],
+                           "content": "\n".join(line.rstrip() for line in content.split("\n"))})
+    return normalized
+
+
+def cache_key(digest, options, messages):
+    """Key identifying a reply: model digest, request options and the messages sent"""
+    payload = json.dumps([digest, options, normalize_messages(messages)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CachedReply:
+    """A stored reply replayed through the same interface as a scheduled Generation"""
+
+    state = "done"
+    position = None
+    queued = False
+    cancelled = False
+
+    def __init__(self, content, done, replay_seconds=REPLAY_SECONDS):
+        self.content = content
+        self.done = done
+        self._replay_seconds = replay_seconds
+        self.submitted_at = self.started_at = time.monotonic()
+
+    def wait_started(self, timeout=None):
+        return True
+
+    def cancel(self):
+        pass
+
+    def __iter__(self):
+        pieces = _PIECES.findall(self.content)
+        delay = self._replay_seconds / len(pieces) if pieces else 0.0
+        for piece in pieces:
+            yield {"message": {"role": "assistant", "content": piece}, "done": False}
+            time.sleep(delay)
+        yield {**self.done, "message": {"role": "assistant", "content": ""}, "done": True, "cached": True}
+
+
+class ResponseCache:
+    """Replies keyed by cache_key(), shared by every session.
+
+    Stored in SQLite in the data directory. Once the stored text exceeds
+    `max_bytes`, the least recently used replies are dropped.
+    """
+
+    def __init__(self, path=os.path.join(DATA_DIR, "response_cache.db"),
+                 max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def get(self, key):
+        """The cached reply for `key` as a CachedReply, or None"""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT content, done FROM replies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE replies SET used_at = ?, hits = hits + 1 WHERE key = ?",
+                             (time.time(), key))
+        return CachedReply(row[0], json.loads(row[1]))
+
+    def put(self, key, model, content, done):
+        """Store a finished reply and the final chunk Ollama sent with it"""
+        done = {field: value for field, value in done.items() if field != "message"}
+        size = len(content.encode()) + len(key)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO replies (key, model, content, done, size, created_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(done), size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock and a transaction
+        excess = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM replies ORDER BY used_at"):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._db.executemany("DELETE FROM replies WHERE key = ?", victims)
+
+    def stats(self):
+        """Number of cached replies, their total size and how often they were replayed"""
+        with self._lock:
+            count, size, hits = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM replies"
+            ).fetchone()
+        return {"replies": count, "bytes": size, "hits": hits}
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM replies")
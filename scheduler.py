@@ -0,0 +1,197 @@
+"""Admission control and fair scheduling for chat generations"""
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (GENERATION_QUEUE_LIMIT, GENERATION_QUEUE_TIMEOUT,
+                    GENERATION_WORKERS, OLLAMA_NUM_PARALLEL)
+from ollama_client import default_client
+
+_DONE = object()
+
+
+class QueueFull(Exception):
+    """Raised when the generation queue can't take another request"""
+
+
+class Generation:
+    """A queued or running chat request; iterate it to receive stream chunks"""
+
+    def __init__(self, session_id, model, request, fair_key):
+        self.session_id = session_id
+        self.model = model
+        self.request = request
+        self.fair_key = fair_key
+        self.state = "queued"
+        self.position = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._chunks = queue.Queue()
+        self._started = threading.Event()
+        self._cancelled = threading.Event()
+
+    @property
+    def queued(self):
+        return self.state == "queued"
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait_started(self, timeout=None):
+        """Block until the request leaves the queue; False on timeout"""
+        return self._started.wait(timeout)
+
+    def cancel(self):
+        """Stop the request, whether it is still queued or already streaming"""
+        self._cancelled.set()
+
+    def drain(self):
+        """Chunks received since the last call, without blocking.
+
+        Returns (chunks, finished); raises the request's error if it failed.
+        Lets one script run interleave several streaming generations.
+        """
+        chunks = []
+        while True:
+            try:
+                item = self._chunks.get_nowait()
+            except queue.Empty:
+                return chunks, False
+            if item is _DONE:
+                return chunks, True
+            if isinstance(item, Exception):
+                raise item
+            chunks.append(item)
+
+    def __iter__(self):
+        while True:
+            item = self._chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class GenerationScheduler:
+    """Runs chat requests on a bounded worker pool with per-model limits.
+
+    At most `per_model` generations stream from one model at a time (match
+    it to the server's OLLAMA_NUM_PARALLEL) and at most `workers` overall.
+    Waiting requests are ordered by virtual round per session, so a session
+    that submits many prompts can't starve the others. When `max_queue`
+    requests are already waiting, new ones are rejected with QueueFull, and
+    a request that waits longer than `queue_timeout` fails instead of
+    piling up behind the others.
+    """
+
+    def __init__(self, client=None, workers=GENERATION_WORKERS, per_model=OLLAMA_NUM_PARALLEL,
+                 max_queue=GENERATION_QUEUE_LIMIT, queue_timeout=GENERATION_QUEUE_TIMEOUT):
+        self._client = client or default_client()
+        self._workers = workers
+        self._per_model = per_model
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = {}
+        self._rounds = {}
+        self._round = 0
+        self._seq = itertools.count()
+        threading.Thread(target=self._dispatch_forever, name="generation-dispatch", daemon=True).start()
+
+    def submit(self, session_id, model, messages, options=None, keep_alive=None):
+        """Queue a streaming chat request, or raise QueueFull"""
+        request = {"model": model, "messages": messages, "options": options, "keep_alive": keep_alive}
+        with self._cond:
+            if len(self._waiting) >= self._max_queue:
+                raise QueueFull(f"{len(self._waiting)} requests are already waiting")
+            fair_round = max(self._rounds.get(session_id, 0), self._round)
+            self._rounds[session_id] = fair_round + 1
+            generation = Generation(session_id, model, request, (fair_round, next(self._seq)))
+            self._waiting.append(generation)
+            self._update_positions()
+            self._cond.notify_all()
+        return generation
+
+    def stats(self):
+        """Waiting and running generation counts"""
+        with self._cond:
+            return {"waiting": len(self._waiting), "running": sum(self._running.values())}
+
+    def _update_positions(self):
+        # Caller holds the lock
+        self._waiting.sort(key=lambda generation: generation.fair_key)
+        for position, generation in enumerate(self._waiting, start=1):
+            generation.position = position
+
+    def _next_runnable(self):
+        # Caller holds the lock; the waiting list is kept in fair order
+        if sum(self._running.values()) >= self._workers:
+            return None
+        for generation in self._waiting:
+            if self._running.get(generation.model, 0) < self._per_model:
+                return generation
+        return None
+
+    def _expire(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        for generation in list(self._waiting):
+            if generation.cancelled:
+                self._waiting.remove(generation)
+                self._finish(generation, "cancelled")
+            elif now - generation.submitted_at > self._queue_timeout:
+                self._waiting.remove(generation)
+                generation._chunks.put(QueueFull(
+                    f"Waited more than {self._queue_timeout:.0f}s for {generation.model}"))
+                self._finish(generation, "failed")
+
+    def _finish(self, generation, state):
+        generation.state = state
+        generation.position = None
+        generation._chunks.put(_DONE)
+        generation._started.set()
+
+    def _dispatch_forever(self):
+        with self._cond:
+            while True:
+                self._expire()
+                generation = self._next_runnable()
+                if generation is None:
+                    self._cond.wait(timeout=1.0)
+                    continue
+                self._waiting.remove(generation)
+                self._update_positions()
+                self._running[generation.model] = self._running.get(generation.model, 0) + 1
+                self._round = generation.fair_key[0]
+                generation.state = "running"
+                generation.position = None
+                generation.started_at = time.monotonic()
+                generation._started.set()
+                self._executor.submit(self._run, generation)
+
+    def _run(self, generation):
+        state = "done"
+        try:
+            stream = self._client.chat(stream=True, **generation.request)
+            for chunk in stream:
+                if generation.cancelled:
+                    # Closing the generator closes the HTTP stream to Ollama
+                    stream.close()
+                    state = "cancelled"
+                    break
+                generation._chunks.put(chunk)
+        except Exception as e:
+            generation._chunks.put(e)
+            state = "failed"
+        finally:
+            with self._cond:
+                self._running[generation.model] -= 1
+                self._cond.notify_all()
+            generation.state = state
+            generation._chunks.put(_DONE)
@@ -0,0 +1,140 @@
+"""Frame-rate limited rendering of streamed model output"""
+import re
+import time
+
+from config import STREAM_FPS, STREAM_MAX_PENDING_BYTES
+
+CURSOR = "▌"
+
+# Lines that open or close a fenced code block or a display math block
+FENCES = ("```", "~~~", "$$")
+
+# HTML elements without a closing tag, which never hold a block open
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                 "track", "wbr"}
+HTML_OPEN = re.compile(r"<([A-Za-z][A-Za-z0-9-]*)(?=[\s/>]|$)")
+
+# A link reference definition, or a link that may refer to one (but not an
+# inline link, an image or a task list checkbox)
+LINK_REFERENCE = re.compile(r"^ {0,3}\[[^\]]+\]:|(?<![\w!\\])\[(?![ xX]?\])[^\]]+\](?!\()")
+
+
+def _html_block_end(line):
+    """Text that closes the HTML block `line` opens, or None if it opens none"""
+    if line.startswith("<!--"):
+        return None if "-->" in line[4:] else "-->"
+    match = HTML_OPEN.match(line)
+    if not match:
+        return None
+    tag = match.group(1).lower()
+    if tag in VOID_ELEMENTS or line.endswith("/>") or f"</{tag}" in line.lower():
+        return None
+    return f"</{tag}"
+
+
+def last_block_boundary(text, start=0):
+    """Offset of the last markdown block boundary at or after `start`.
+
+    A boundary is the start of an unindented line that follows a blank line
+    outside a fenced code block, $$ math block or HTML block, so everything
+    before it is made of complete blocks whose rendering can no longer
+    change as more text streams in. Link reference definitions apply to the
+    whole reply, so nothing from the first block that defines or may use
+    one is frozen. `start` must itself be a boundary (or 0).
+    """
+    boundary = start
+    # What closes the open fence or HTML block, if any
+    fence = html = None
+    previous_blank = False
+    pos = start
+    while True:
+        if previous_blank and not (fence or html) and text[pos:pos + 1] not in ("", " ", "\t", "\n"):
+            boundary = pos
+        end = text.find("\n", pos)
+        if end == -1:
+            # The last line is still streaming in
+            return boundary
+        line = text[pos:end].strip()
+        if fence:
+            if fence == "$$" and line.count("$$") % 2 or fence != "$$" and line.startswith(fence):
+                fence = None
+        elif line.startswith(FENCES):
+            # A line like "$$ x $$" is a whole formula rather than the start of one
+            if not line.startswith("$$") or line.count("$$") % 2:
+                fence = line[:2] if line.startswith("$$") else line[:3]
+        elif html:
+            if html in line.lower():
+                html = None
+        elif LINK_REFERENCE.search(text[pos:end]):
+            return boundary
+        else:
+            html = _html_block_end(line)
+        previous_blank = not line
+        pos = end + 1
+
+
+class StreamRenderer:
+    """Accumulates streamed chunks and redraws the reply in batches.
+
+    A redraw happens when 1/fps seconds have passed since the last one, or
+    when more than `max_pending_bytes` of text arrived since then, so the
+    number of markdown re-renders depends on elapsed time rather than on the
+    number of tokens. Chunks are collected in a list and joined once per
+    frame instead of concatenating a growing string per token.
+
+    Only the live tail is re-rendered: once a markdown block is complete it
+    is written once into its own element inside `container`, and the
+    `tail` placeholder below it redraws just the unfinished block.
+    """
+
+    def __init__(self, container, fps=STREAM_FPS, max_pending_bytes=STREAM_MAX_PENDING_BYTES,
+                 clock=time.monotonic):
+        self._blocks = container.container()
+        self.tail = container.empty()
+        self._frozen = 0
+        self._interval = 1.0 / fps if fps > 0 else 0.0
+        self._max_pending = max_pending_bytes
+        self._clock = clock
+        self._parts = []
+        self._pending = 0
+        self._last_render = None
+        self.frames = 0
+        # Wall time spent issuing redraws, to tell UI overhead from generation time
+        self.render_seconds = 0.0
+
+    @property
+    def text(self):
+        """Everything received so far"""
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def feed(self, chunk):
+        """Add a chunk of text, redrawing only if a frame is due"""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._pending += len(chunk)
+        now = self._clock()
+        if (self._last_render is None
+                or now - self._last_render >= self._interval
+                or self._pending >= self._max_pending):
+            self._render(self.text, now)
+
+    def finish(self):
+        """Draw the final text without the cursor and return it"""
+        text = self.text
+        self._render(text, self._clock(), cursor="")
+        return text
+
+    def _render(self, text, now, cursor=CURSOR):
+        started = time.perf_counter()
+        boundary = last_block_boundary(text, self._frozen)
+        if boundary > self._frozen:
+            self._blocks.markdown(text[self._frozen:boundary])
+            self._frozen = boundary
+        self.tail.markdown(text[self._frozen:] + cursor)
+        self._pending = 0
+        self._last_render = now
+        self.frames += 1
+        self.render_seconds += time.perf_counter() - started
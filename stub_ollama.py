@@ -0,0 +1,298 @@
+"""Fake Ollama HTTP server for offline benchmarks and development
+
+Serves the parts of the Ollama REST API NeuralNexus uses, with configurable
+latency, model load time and token rate, and counts every call per
+endpoint. Run it standalone and point OLLAMA_HOST at it:
+
+    python stub_ollama.py --port 11500 --tokens-per-second 50
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = ("llama2:latest", "mistral:latest", "phi:latest")
+MODEL_SIZE = 4_000_000_000
+EMBEDDING_DIM = 64
+
+
+class StubOllama:
+    """An in-process fake Ollama server.
+
+    `latency` is added to every request, `load_seconds` to the first
+    request that loads a model, and chat replies stream `reply_tokens`
+    tokens at `tokens_per_second`. Loaded models expire like Ollama's do,
+    `keep_alive` seconds after the last request that used them. Use it as
+    a context manager, or call start() and stop().
+    """
+
+    def __init__(self, models=DEFAULT_MODELS, port=0, latency=0.0, load_seconds=0.0,
+                 tokens_per_second=200.0, reply_tokens=50, keep_alive=300.0):
+        self.models = list(models)
+        self.latency = latency
+        self.load_seconds = load_seconds
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.keep_alive = keep_alive
+        self.calls = Counter()
+        # Loaded model -> when it expires (None for never)
+        self.loaded = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def call_counts(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def _count(self, path):
+        with self._lock:
+            self.calls[path] += 1
+
+    def _load(self, model, keep_alive=None):
+        """Mark `model` loaded; returns the simulated load time in ns"""
+        with self._lock:
+            self._expire()
+            cold = model not in self.loaded
+            seconds = _parse_keep_alive(keep_alive, self.keep_alive)
+            self.loaded[model] = (datetime.now(timezone.utc) + timedelta(seconds=seconds)
+                                  if seconds >= 0 else None)
+        if cold and self.load_seconds:
+            time.sleep(self.load_seconds)
+        return int(self.load_seconds * 1e9) if cold else 1_000_000
+
+    def _unload(self, model):
+        with self._lock:
+            self.loaded.pop(model, None)
+
+    def _expire(self):
+        # Caller holds the lock
+        now = datetime.now(timezone.utc)
+        for model, expires_at in list(self.loaded.items()):
+            if expires_at is not None and expires_at <= now:
+                del self.loaded[model]
+
+
+def _parse_keep_alive(value, default):
+    """Seconds from an Ollama keep_alive value ("5m", "300s", 300)"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1:] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _embedding(text):
+    # Hashed bag of words: texts sharing words get similar vectors, as with a real model
+    vector = [0.0] * EMBEDDING_DIM
+    for word in text.lower().split():
+        vector[zlib.crc32(word.strip(".,;:!?\"'()").encode()) % EMBEDDING_DIM] += 1.0
+    return vector
+
+
+def _handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; don't let Nagle delay the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_stream(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _send_chunk(self, payload):
+            data = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _end_stream(self):
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _begin(self):
+            stub._count(self.path)
+            if stub.latency:
+                time.sleep(stub.latency)
+
+        def do_GET(self):
+            self._begin()
+            if self.path == "/api/ps":
+                with stub._lock:
+                    stub._expire()
+                    loaded = dict(stub.loaded)
+                # Ollama reports a model kept forever as expiring far in the future
+                forever = datetime.now(timezone.utc) + timedelta(days=365 * 100)
+                self._send_json({"models": [
+                    {"name": name, "model": name, "size": MODEL_SIZE, "size_vram": MODEL_SIZE,
+                     "digest": f"sha256:{name}", "expires_at": (expires_at or forever).isoformat()}
+                    for name, expires_at in sorted(loaded.items())
+                ]})
+            elif self.path == "/api/tags":
+                self._send_json({"models": [
+                    {"name": name, "model": name, "size": MODEL_SIZE, "digest": f"sha256:{name}",
+                     "modified_at": "2024-01-01T00:00:00Z",
+                     "details": {"format": "gguf", "family": "llama", "parameter_size": "7B",
+                                 "quantization_level": "Q4_0"}}
+                    for name in stub.models
+                ]})
+            elif self.path == "/api/version":
+                self._send_json({"version": "0.0.0-stub"})
+            else:
+                self._send_json({"error": f"no route {self.path}"}, 404)
+
+        def do_POST(self):
+            self._begin()
+            body = self._body()
+            model = body.get("model") or body.get("name")
+            if self.path == "/api/show":
+                if model not in stub.models:
+                    self._send_json({"error": f"model '{model}' not found"}, 404)
+                    return
+                self._send_json({"modelfile": f"FROM {model}", "parameters": "", "template": "",
+                                 "modified_at": "2024-01-01T00:00:00Z",
+                                 "details": {"format": "gguf", "family": "llama",
+                                             "parameter_size": "7B", "quantization_level": "Q4_0"}})
+            elif self.path == "/api/generate":
+                if body.get("keep_alive") in (0, "0", "0s"):
+                    stub._unload(model)
+                    self._send_json({"model": model, "response": "", "done": True,
+                                     "done_reason": "unload"})
+                    return
+                load = stub._load(model, body.get("keep_alive"))
+                self._send_json({"model": model, "response": "", "done": True,
+                                 "load_duration": load, "total_duration": load})
+            elif self.path == "/api/chat":
+                self._chat(model, body)
+            elif self.path == "/api/pull":
+                self._pull(model, body)
+            elif self.path == "/api/embed":
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send_json({"model": model, "embeddings": [_embedding(text) for text in inputs]})
+            elif self.path == "/api/embeddings":
+                self._send_json({"embedding": _embedding(body.get("prompt", ""))})
+            else:
+                self._send_json({"error": f"no route {self.path}"}, 404)
+
+        def do_DELETE(self):
+            self._begin()
+            model = self._body().get("name")
+            stub._unload(model)
+            if model in stub.models:
+                stub.models.remove(model)
+            self._send_json({})
+
+        def _chat(self, model, body):
+            started = time.perf_counter()
+            load = stub._load(model, body.get("keep_alive"))
+            prompt_tokens = sum(len(m.get("content", "")) // 4 + 4 for m in body.get("messages", []))
+            delay = 1.0 / stub.tokens_per_second if stub.tokens_per_second > 0 else 0.0
+            tokens = [f"token{i} " if i % 12 else "\n\n" for i in range(1, stub.reply_tokens + 1)]
+            done = {"model": model, "done": True, "done_reason": "stop",
+                    "load_duration": load, "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": 1_000_000, "eval_count": len(tokens)}
+            if not body.get("stream", True):
+                time.sleep(delay * len(tokens))
+                done["eval_duration"] = int(delay * len(tokens) * 1e9)
+                done["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                self._send_json({**done, "message": {"role": "assistant", "content": "".join(tokens)}})
+                return
+            self._start_stream()
+            eval_started = time.perf_counter()
+            for token in tokens:
+                if delay:
+                    time.sleep(delay)
+                self._send_chunk({"model": model, "done": False,
+                                  "message": {"role": "assistant", "content": token}})
+            done["eval_duration"] = int((time.perf_counter() - eval_started) * 1e9)
+            done["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._send_chunk({**done, "message": {"role": "assistant", "content": ""}})
+            self._end_stream()
+
+        def _pull(self, model, body):
+            name = model if ":" in model else f"{model}:latest"
+            self._start_stream()
+            self._send_chunk({"status": "pulling manifest"})
+            digest = f"sha256:{name}"
+            for completed in range(0, MODEL_SIZE + 1, MODEL_SIZE // 4):
+                self._send_chunk({"status": f"pulling {digest[7:19]}", "digest": digest,
+                                  "total": MODEL_SIZE, "completed": completed})
+                time.sleep(0.01)
+            self._send_chunk({"status": "success"})
+            self._end_stream()
+            if name not in stub.models:
+                stub.models.append(name)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="simulated model load time")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=50)
+    args = parser.parse_args()
+    stub = StubOllama(port=args.port, latency=args.latency, load_seconds=args.load_seconds,
+                      tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens)
+    print(f"Stub Ollama listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,37 @@
 import webview
 import subprocess
+import socket
 import time
 import sys
 import os
+import threading
 
-def run_streamlit():
-    # Start Streamlit in the background with cyberpunk dark theme
-    streamlit_process = subprocess.Popen(
-        ['streamlit', 'run', 'app.py', 
-         '--server.port', '8501', 
+import httpx
+
+from config import DATA_DIR, STARTUP_TIMEOUT
+from ollama_client import OllamaClient
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PREFERRED_PORT = 8501
+
+def find_free_port(preferred=PREFERRED_PORT):
+    """Return the preferred port if it is free, otherwise any free port"""
+    for port in (preferred, 0):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(('localhost', port))
+            except OSError:
+                continue
+            return sock.getsockname()[1]
+    raise RuntimeError("No free port available for Streamlit")
+
+def start_streamlit(port, log_file):
+    """Start Streamlit in the background with cyberpunk dark theme"""
+    return subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', 'app.py',
+         '--server.port', str(port),
          '--browser.serverAddress', 'localhost',
-         '--browser.serverPort', '8501',
+         '--browser.serverPort', str(port),
          '--browser.gatherUsageStats', 'false',
          '--server.headless', 'true',
          '--theme.base', 'dark',
@@ -19,29 +40,83 @@ def run_streamlit():
          '--theme.secondaryBackgroundColor', '#1a1a2f',  # Dark blue
          '--theme.textColor', '#e0e0ff',  # Soft blue-white
          '--theme.font', 'monospace'],  # Cyberpunk-style font
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-    
-    # Wait for Streamlit to start
-    time.sleep(2)
-    
-    # Create window with dark theme and slightly more compact size
-    window = webview.create_window(
-        'NeuralNexus - Local LLM Interface',
-        'http://localhost:8501',
-        width=1100,  # Slightly smaller width
-        height=750,  # Slightly smaller height
-        resizable=True,
-        min_size=(800, 600),  # Reasonable minimum size
-        background_color='#0a0a12'  # Match the dark background
+        cwd=APP_DIR,
+        # Send output to a log file so a chatty server can never fill a pipe and stall
+        stdout=log_file,
+        stderr=subprocess.STDOUT
     )
+
+def wait_until_healthy(process, port, timeout=STARTUP_TIMEOUT):
+    """Poll Streamlit's health endpoint with backoff until it answers"""
+    url = f'http://localhost:{port}/_stcore/health'
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    with httpx.Client(timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                return False
+            try:
+                if client.get(url).status_code == 200:
+                    return True
+            except httpx.TransportError:
+                pass
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+    return False
+
+def warm_ollama():
+    """Wake the Ollama daemon while Streamlit boots.
+
+    The app runs in its own process with its own caches, so this only makes
+    one cheap request; reading the catalog here would be thrown away.
+    """
+    client = OllamaClient()
+    try:
+        client.ps()
+    except Exception:
+        # Ollama may not be running yet; the app reports that itself
+        pass
+    finally:
+        client.close()
+
+def run_streamlit():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    log_path = os.path.join(DATA_DIR, 'streamlit.log')
+    port = find_free_port()
     
-    # Start the window
-    webview.start(debug=False)
-    
-    # Cleanup
-    streamlit_process.terminate()
+    with open(log_path, 'ab') as log_file:
+        streamlit_process = start_streamlit(port, log_file)
+        
+        try:
+            # Warm up Ollama in parallel; the window doesn't wait for it
+            threading.Thread(target=warm_ollama, daemon=True).start()
+            
+            # Wait until Streamlit actually answers
+            if not wait_until_healthy(streamlit_process, port):
+                print(f"Streamlit did not start; see {log_path}", file=sys.stderr)
+                return 1
+            
+            # Create window with dark theme and slightly more compact size
+            window = webview.create_window(
+                'NeuralNexus - Local LLM Interface',
+                f'http://localhost:{port}',
+                width=1100,  # Slightly smaller width
+                height=750,  # Slightly smaller height
+                resizable=True,
+                min_size=(800, 600),  # Reasonable minimum size
+                background_color='#0a0a12'  # Match the dark background
+            )
+            
+            # Start the window
+            webview.start(debug=False)
+            return 0
+        finally:
+            # Cleanup
+            streamlit_process.terminate()
+            try:
+                streamlit_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                streamlit_process.kill()
 
 if __name__ == '__main__':
-    run_streamlit() 
\ No newline at end of file
+    sys.exit(run_streamlit())